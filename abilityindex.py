@@ -0,0 +1,68 @@
+import globals
+import xmlbackend
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Union
+
+# Name lookups into proto.xml, abilities.xml and the merged civ abilities/god powers, built once so they don't each need a scan of the whole file.
+# The game matches a lot of these names case insensitively (abilities.xml's unit entries are all lowercased), so there are lowercase versions.
+#
+# Precedence when the same name is defined more than once:
+#   - protos and abilities.xml unit entries: the first in tree order wins, the same as the find()s and scans these replace
+#   - civ abilities and god powers: the LAST definition wins. Files are merged in filename order, each file's powers in document order (see mergePowerFiles).
+#     This is what the old merge did by inserting everything at the front and then find()ing the first match.
+
+def mergePowerFiles(files: Dict[str, ET.Element], extension: str) -> ET.Element:
+    combined = xmlbackend.makeElement("powers")
+    for filename in sorted(name for name in files.keys() if name.endswith(extension)):
+        # With lxml, append moves the node out of the file's root, so iterate over a copy
+        for child in list(files[filename]):
+            combined.append(child)
+    return combined
+
+def _indexPowers(combined: ET.Element, byName: Dict[str, ET.Element], byLowerName: Union[Dict[str, ET.Element], None]=None):
+    for power in combined.iterfind("power"):
+        name = power.attrib.get("name")
+        if name is None:
+            continue
+        byName[name] = power
+        if byLowerName is not None:
+            byLowerName[name.lower()] = power
+
+class AbilityIndex:
+    def __init__(self, protoRoot: ET.Element, abilitiesXml: ET.Element, abilitiesCombined: ET.Element, godPowersCombined: ET.Element):
+        self.protoByLowerName: Dict[str, ET.Element] = {}
+        for proto in protoRoot:
+            self.protoByLowerName.setdefault(proto.attrib["name"].lower(), proto)
+        self.powerByName: Dict[str, ET.Element] = {}
+        self.powerByLowerName: Dict[str, ET.Element] = {}
+        _indexPowers(abilitiesCombined, self.powerByName, self.powerByLowerName)
+        self.godPowerByName: Dict[str, ET.Element] = {}
+        _indexPowers(godPowersCombined, self.godPowerByName)
+        self.godPowersCombined = godPowersCombined
+        # Lowercase proto name: its abilities.xml ability nodes
+        self.abilitiesByLowerProtoName: Dict[str, List[ET.Element]] = {}
+        for unitEntry in abilitiesXml:
+            if unitEntry.tag not in self.abilitiesByLowerProtoName:
+                self.abilitiesByLowerProtoName[unitEntry.tag] = list(unitEntry)
+
+    def protoCaseInsensitive(self, protoName: str) -> Union[ET.Element, None]:
+        return self.protoByLowerName.get(protoName.lower(), None)
+
+    def power(self, powerName: str) -> Union[ET.Element, None]:
+        return self.powerByName.get(powerName, None)
+
+    def powerCaseInsensitive(self, powerName: str) -> Union[ET.Element, None]:
+        return self.powerByLowerName.get(powerName.lower(), None)
+
+    def godPower(self, powerName: str) -> Union[ET.Element, None]:
+        return self.godPowerByName.get(powerName, None)
+
+    # Highest precedence first, which is the order the god powers have always been generated in
+    def godPowersInPrecedenceOrder(self) -> List[ET.Element]:
+        return list(reversed(self.godPowersCombined))
+
+    def abilitiesForProto(self, protoName: str) -> Union[List[ET.Element], None]:
+        return self.abilitiesByLowerProtoName.get(protoName.lower(), None)
+
+def buildAbilityIndex():
+    globals.abilityIndex = AbilityIndex(globals.dataCollection["proto.xml"], globals.dataCollection["abilities"]["abilities.xml"], globals.dataCollection["abilities_combined"], globals.dataCollection["god_powers_combined"])
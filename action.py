@@ -4,7 +4,7 @@ from common import findAndFetchText, protoFromName
 import icon
 import globals
 from xml.etree import ElementTree as ET
-from typing import Union, Dict, List, Callable, Any, Type, Tuple
+from typing import Union, Dict, List, Callable, Any, Type, Tuple, Iterable
 import math
 import copy
 import re
@@ -12,6 +12,11 @@ import unitdescription
 import functools
 import dataclasses
 import godpower
+import protorecord
+import animtiming
+import xmlbackend
+import tooltipdoc
+import diagnostics
 
 class ActionChargeType(enum.Enum):
     NONE = 0
@@ -84,6 +89,43 @@ ACTION_TYPE_NAMES = {
     "CallOfLykaionSpawn":"",
 }
 
+# Results of the damage helpers, which get asked for the same attack by the unit, tech, god power and major god generators.
+# Keyed on the proto's name, the action (element identity or name) and the formatting arguments. The data doesn't change after load, so nothing here ever goes stale within a build
+# Each entry keeps the warnings its first call gave, and gives them again on every hit
+_ACTION_RESULT_CACHES: List[Dict] = []
+
+# Unit description overrides change some of the output (action display names, infection text) and are still being registered while generation is going on,
+# so the version at which the proto's override was last written is part of the key
+def _protoCacheKey(proto: Union[str, ET.Element]):
+    protoName = proto.attrib.get("name") if isinstance(proto, xmlbackend.ELEMENT_TYPES) else proto
+    return protoName, unitdescription.unitDescriptionOverrides.keyVersion(protoName)
+
+def cachedByProtoAndAction(func):
+    cache = {}
+    _ACTION_RESULT_CACHES.append(cache)
+    @functools.wraps(func)
+    def wrapper(proto, action, *args, **kwargs):
+        key = (*_protoCacheKey(proto), action, args, tuple(sorted(kwargs.items())) if kwargs else ())
+        if key in cache:
+            result, warnings = cache[key]
+            # Give the first call's warnings again, so the diagnostics counts are the same as they'd be without the cache
+            if warnings:
+                diagnostics.collector.merge(warnings)
+            return result
+        warnings = []
+        diagnostics.collector.recorders.append(warnings)
+        try:
+            result = func(proto, action, *args, **kwargs)
+        finally:
+            diagnostics.collector.recorders.pop()
+        cache[key] = (result, warnings)
+        return result
+    return wrapper
+
+def clearActionResultCaches():
+    for cache in _ACTION_RESULT_CACHES:
+        cache.clear()
+
 def findFromActionOrTactics(action: ET.Element, tactics: ET.Element, query: str, default: Any=None, conversion: Union[None, Type] = None):
     val = findAndFetchText(action, query, None, conversion)
     if val is None and tactics is not None:
@@ -103,6 +145,7 @@ def findAllFromActionOrTactics(action: Union[None, ET.Element], tactics: Union[N
 
 
 
+@functools.cache
 def actionDamageBonus(action: ET.Element):
     damageBonuses = action.findall("damagebonus")
     actionDamageBonuses = []
@@ -126,6 +169,7 @@ def actionDamageBonus(action: ET.Element):
         return f"({', '.join(actionDamageBonuses)})"
     return ""
         
+@cachedByProtoAndAction
 def actionDamageOnly(proto: ET.Element, action: ET.Element, isDPS=False, hideNumProjectiles=False, damageMultiplier=1.0):
     damages = []
     # I used to not multiply up if showing projectiles to show damage per projectile...
@@ -151,6 +195,7 @@ def actionDamageOnly(proto: ET.Element, action: ET.Element, isDPS=False, hideNum
     
     return final
 
+@cachedByProtoAndAction
 def actionNumProjectiles(proto: ET.Element, action: ET.Element, format=True):
     displayedNumProjectiles = findAndFetchText(action, "displayednumberprojectiles", None, int)
     numProjectilesFromData = findAndFetchText(action, "numberprojectiles", 1, int)
@@ -172,6 +217,7 @@ def actionRof(action: ET.Element):
     return f"{icon.iconRof()} {rof:0.3g}"
 
 
+@cachedByProtoAndAction
 def actionDamageMultiplier(proto: ET.Element, action: ET.Element, isDPS=True, singleProjectile=False):
     rof = findAndFetchText(action, "rof", 1.0, float)
     if not isDPS:
@@ -185,6 +231,7 @@ def actionDamageMultiplier(proto: ET.Element, action: ET.Element, isDPS=True, si
     return 1.0/rof
     
 
+@cachedByProtoAndAction
 def actionDamageFull(protoUnit: ET.Element, action: ET.Element, isDPS=False, hideArea=False, damageMultiplier=1.0, hideRof=False, hideRange=False, ignoreActive=False, hideDamageBonuses=False, hideDamage=False):
     # Scorpion man special attack has displayed num projectiles but no actual projectiles
     # I think it makes 3 little attacks and this is how the developers opted to represent that
@@ -280,11 +327,20 @@ def rechargeRate(proto: ET.Element, action:ET.Element, chargeType: ActionChargeT
     
     # Use unit type data first
     rechargeType = None
-    rechargeTime = findAndFetchText(proto, "auxrechargetime" if chargeType == ActionChargeType.AUX else "rechargetime", None, float)
-    rechargeElem = proto.find("auxrecharge" if chargeType == ActionChargeType.AUX else "recharge")
-    if rechargeElem is not None:
-        rechargeTime = float(rechargeElem.text)
-        rechargeType = rechargeElem.attrib.get("type", None)
+    record = protorecord.recordForProto(proto)
+    if record is not None:
+        if chargeType == ActionChargeType.AUX:
+            rechargeTime, recharge, rechargeType = record.auxrechargetime, record.auxrecharge, record.auxrechargetype
+        else:
+            rechargeTime, recharge, rechargeType = record.rechargetime, record.recharge, record.rechargetype
+        if recharge is not None:
+            rechargeTime = recharge
+    else:
+        rechargeTime = findAndFetchText(proto, "auxrechargetime" if chargeType == ActionChargeType.AUX else "rechargetime", None, float)
+        rechargeElem = proto.find("auxrecharge" if chargeType == ActionChargeType.AUX else "recharge")
+        if rechargeElem is not None:
+            rechargeTime = float(rechargeElem.text)
+            rechargeType = rechargeElem.attrib.get("type", None)
     # Override with techs if supplied, assumes that the techs will be setting the recharge settings on the right proto (and there's only one of these effects)
     if tech is not None:
         techRechargeType = tech.find("effects/effect[@subtype='RechargeType']")
@@ -362,6 +418,7 @@ def onhiteffectTargetString(onhiteffect: ET.Element, hitword="hit", default="tar
         return ""
     return f"{hitword} {default}"
 
+@cachedByProtoAndAction
 def actionDamageOverTime(proto: ET.Element, action: ET.Element, isDPS=False, damageMultiplier=1.0, singleProjectile=False, ignoreActive=False):
     dots = action.findall("onhiteffect[@type='DamageOverTime']")
     dur = None
@@ -781,12 +838,10 @@ def findActionByName(proto: Union[ET.Element, str], actionName: Union[ET.Element
     result = proto.find(f"protoaction[name='{actionName}']")
     if result is not None:
         return result
-    # The game does this in a case insensitive manner, it looks like trying to get native support for case insensitive xpath in ElementTree is way way more trouble than doing this
-    # and accepting it's a bit inefficient
-    allActions = proto.findall("protoaction")
-    for action in allActions:
-        if findAndFetchText(action, "name", "").lower() == actionName.lower():
-            return action
+    # The game does this in a case insensitive manner, which ElementTree's xpath can't do (lxml's can)
+    result = xmlbackend.findChildByTextCaseInsensitive(proto, "protoaction", "name", actionName)
+    if result is not None:
+        return result
 
     # It could still be an action defined only in the tactics file
     tactics = actionTactics(proto, actionName)
@@ -2140,34 +2195,38 @@ def handleGatherAction(proto: ET.Element, action: ET.Element, tactics: Union[Non
                 if rate != standardRate:
                     #raise ValueError(f"Peach blossom spring for {targetRes} on {proto.attrib['name']} doesn't match standard target {standardTarget} rate: {rate} vs standard {standardRate}")
                     common.warn_data(f"Mismatched Peach blossom spring for {targetRes} on {proto.attrib['name']} doesn't match standard target {standardTarget} rate: {rate} vs standard {standardRate}")
-                    items.append(f"{targetRes} (from Peach Blossom): {rate}")
+                    items.append(tooltipdoc.TooltipDocument(f"{targetRes} (from Peach Blossom): {rate}"))
             elif target == "AbstractShrineJapanese":
                 mikoBaseRate = findAndFetchText(findActionByName("Miko", "GatherShrine"), "rate[@type='AbstractShrineJapanese']", 0.0, float)
                 thisMultiplier = rate/mikoBaseRate
                 if thisMultiplier == 1.0:
-                    items.append(f"Shrine Favor: {rate:0.3g} plus contribution from resources in range")
+                    items.append(tooltipdoc.TooltipDocument(f"Shrine Favor: {rate:0.3g} plus contribution from resources in range"))
                 else:
-                    items.append(f"Shrine Favor: {rate:0.3g} plus {thisMultiplier:0.3g}x displayed contribution from resources in range")
+                    items.append(tooltipdoc.TooltipDocument(f"Shrine Favor: {rate:0.3g} plus {thisMultiplier:0.3g}x displayed contribution from resources in range"))
             else:
                 common.warn_unhandled(f"Unknown gather action target on {proto.attrib['name']}: {target}")
                 return ""
         
         if thisIcon is None:
             continue
-        items.append(f"{thisIcon} {rate:0.3g}")
+        items.append(tooltipdoc.TooltipDocument(tooltipdoc.Markup(thisIcon), f" {rate:0.3g}"))
 
     if len(items) == 0:
         return ""
     
     itemsPerLine = 5
-    linePrefix = f"\\n   {icon.BULLET_POINT_ALT}"
     numLines = math.ceil(len(items)/itemsPerLine)
     
-    out = "Gather rates:"
+    out = tooltipdoc.TooltipDocument("Gather rates:")
     for lineIndex in range(0, numLines):
-        out += linePrefix + " ".join(items[lineIndex*itemsPerLine:lineIndex*itemsPerLine + itemsPerLine])
+        line = tooltipdoc.TooltipDocument()
+        for itemIndex, item in enumerate(items[lineIndex*itemsPerLine:lineIndex*itemsPerLine + itemsPerLine]):
+            if itemIndex > 0:
+                line.text(" ")
+            line.add(item)
+        out.line().bullet(line, level=1, gap="")
             
-    return out
+    return out.render()
 
 def handleJumpAction(proto: ET.Element, action: ET.Element, tactics: Union[None, ET.Element], actionName: str, chargeType:ActionChargeType=ActionChargeType.NONE, tech: Union[None, ET.Element]=None):
     if findFromActionOrTactics(action, tactics, "ambushonly", 0):
@@ -2219,21 +2278,23 @@ def devoteMinorHandler(proto: ET.Element, action: ET.Element, tactics: Union[Non
         targetCounts.append(len(tricklerates)-2)
         targetCounts = sorted(targetCounts)
 
-        lines = [""]
+        lines = []
         for index, count in enumerate(targetCounts):
             actualCount = count + 1
             suffix = common.ordinalSuffix(actualCount)
-            text = f"{actualCount}{suffix}: {icon.resourceIcon('favor')} {devotioncountsToFavor[count]:0.3g} instant"
+            line = tooltipdoc.TooltipDocument(f"{actualCount}{suffix}: ").markup(icon.resourceIcon('favor')).text(f" {devotioncountsToFavor[count]:0.3g} instant")
             if actualCount <= len(tricklerates)-1:
-                text += f", {icon.resourceIcon('favor')} {tricklerates[actualCount]:0.3g}/second"
+                line.text(", ").markup(icon.resourceIcon('favor')).text(f" {tricklerates[actualCount]:0.3g}/second")
             if actualCount == len(tricklerates)-1:
-                text += " (max trickle rate)"
+                line.text(" (max trickle rate)")
             if index == len(targetCounts)-1:
-                text += " (min instant reward)"
-            lines.append(text)
+                line.text(" (min instant reward)")
+            lines.append(line)
 
-        text = "May be sacrified at a Temple for favor, with decreasing returns as more are sacrified (full progression in history):"
-        text += f"\\n   {icon.BULLET_POINT_ALT} ".join(lines)
+        text = tooltipdoc.TooltipDocument("May be sacrified at a Temple for favor, with decreasing returns as more are sacrified (full progression in history):")
+        for line in lines:
+            text.line().bullet(line, level=1)
+        text = text.render()
 
         historyText = f"Instant favor rewards follow the following formula, where:\n\nF = total instant favor generated from instant villager devotion:\nB = base favor for devotion, after modifiers (default is {b})\n\n"
         historyText += f"favor = B * (1-(((1-{m})*F)/{e}))"
@@ -2390,13 +2451,10 @@ def selfDestructActionDamage(proto: Union[str, ET.Element]):
     return ""
 
 def getCommonAbilitiesNodeForPowerName(powerName: str) -> Union[None, ET.Element]:
-    abilityInfo = globals.dataCollection["abilities_combined"].find(f"power[@name='{powerName}']")
+    abilityInfo = globals.abilityIndex.power(powerName)
     if abilityInfo is None:
         # The game apparently uses case insensitive matching here - but lowercasing everything will cause issues the moment it doesn't somewhere!
-        for power in globals.dataCollection["abilities_combined"]:
-            if power.attrib["name"].lower() == powerName.lower():
-                abilityInfo = power
-                break
+        abilityInfo = globals.abilityIndex.powerCaseInsensitive(powerName)
     return abilityInfo
 
 def getCivAbilitiesNode(proto: Union[ET.Element, str], action: Union[ET.Element, str], forceAbilityLink: Union[str, None]=None):
@@ -2413,14 +2471,13 @@ def getCivAbilitiesNode(proto: Union[ET.Element, str], action: Union[ET.Element,
     abilityInfo = None
 
     if forceAbilityLink is not None:
-        abilityInfo = globals.dataCollection["abilities_combined"].find(f"power[@name='{forceAbilityLink}']")
+        abilityInfo = globals.abilityIndex.power(forceAbilityLink)
     else:
-        unitAbilitiesEntry = globals.dataCollection["abilities"]["abilities.xml"].find(proto.attrib["name"].lower())
+        unitAbilitiesEntry = globals.abilityIndex.abilitiesForProto(proto.attrib["name"])
         if unitAbilitiesEntry is None:
             pass
         else:
             for abilityNode in unitAbilitiesEntry:
-                abilityInfo = globals.dataCollection["abilities_combined"].find(f"power[@name='{abilityNode.text}']")
                 abilityInfo = getCommonAbilitiesNodeForPowerName(abilityNode.text)
                 if abilityInfo is None:
                     common.warn_data(f"{proto.attrib['name']}'s {common.findAndFetchText(action, "name", "???", str)} has an abilities.xml entry but couldn't find a corresponding civ.abilities")
@@ -2457,7 +2514,7 @@ def getActionDisplayName(proto: Union[ET.Element, str], action: Union[ET.Element
     return actionName
 
 
-def describeAction(proto: Union[str, ET.Element], action: Union[str, ET.Element], chargeType: ActionChargeType=ActionChargeType.NONE, nameOverride: Union[str, None] = None, forceAbilityLink: Union[str, None] = None, overrideText: Union[str, None]=None, tech: Union[ET.Element, None]=None):
+def _describeActionUncached(proto: Union[str, ET.Element], action: Union[str, ET.Element], chargeType: ActionChargeType=ActionChargeType.NONE, nameOverride: Union[str, None] = None, forceAbilityLink: Union[str, None] = None, overrideText: Union[str, None]=None, tech: Union[ET.Element, None]=None):
     if isinstance(proto, str):
         proto = common.protoFromName(proto)
     if isinstance(action, str):
@@ -2498,9 +2555,7 @@ def describeAction(proto: Union[str, ET.Element], action: Union[str, ET.Element]
         #result = f"Unknown: {actionName} - {actionInternalName} - {actionInternalType}"
     else:
         result = handler(proto, action, actionTactics(proto, action), actionName, chargeType, tech)
-        result = common.collapseSpaces(result)
-        result = result.replace("..", ".")
-        result = result.replace(" :", ":")
+        result = tooltipdoc.normaliseText(result)
         if overrideText is not None:
             result = overrideText
         if abilityInfo is not None and proto.attrib["name"] not in common.PROTOS_TO_IGNORE_FOR_ABILITY_TOOLTIPS:
@@ -2510,13 +2565,100 @@ def describeAction(proto: Union[str, ET.Element], action: Union[str, ET.Element]
                 resultForAbility = resultForAbility[len(actionName):].strip()
                 if resultForAbility.startswith(":"):
                     resultForAbility = resultForAbility[1:].strip()
-            common.addToGlobalAbilityStrings(proto, abilityInfo, resultForAbility)
+            _abilityContributionCollectors[-1].append(AbilityStringContribution(proto, abilityInfo, resultForAbility))
         
         
     return result
 
+@dataclasses.dataclass(frozen=True)
+class AbilityStringContribution:
+    proto: ET.Element
+    abilityNode: ET.Element
+    text: str
+
+@dataclasses.dataclass(frozen=True)
+class HistoryTextContribution:
+    objectName: str
+    objectType: str
+    text: Union[str, Tuple[str, ...]]
+
+@dataclasses.dataclass(frozen=True)
+class ActionDescription:
+    text: str
+    # Ability tooltip text this produced (including from any actions described along the way), in the order it was generated
+    abilityContributions: Tuple[AbilityStringContribution, ...]
+    # Text for history files, likewise
+    historyContributions: Tuple[HistoryTextContribution, ...] = ()
+
+# Contributions made while describing an action go to the innermost describeActionResult in progress, so nested descriptions end up in the outer result
+_abilityContributionCollectors: List[List[AbilityStringContribution]] = []
+
+def contributionsAreBeingCollected() -> bool:
+    return len(_abilityContributionCollectors) > 0
+
+def mergeAbilityContributions(contributions: Iterable[AbilityStringContribution]):
+    if _abilityContributionCollectors:
+        _abilityContributionCollectors[-1].extend(contributions)
+        return
+    for contribution in contributions:
+        common.addToGlobalAbilityStrings(contribution.proto, contribution.abilityNode, contribution.text)
+
+def mergeHistoryContributions(contributions: Iterable[HistoryTextContribution]):
+    # Goes to the collector of any description in progress, same as the ability strings
+    for contribution in contributions:
+        common.prependTextToHistoryFile(contribution.objectName, contribution.objectType, contribution.text)
+
+def mergeContributions(result: ActionDescription):
+    mergeAbilityContributions(result.abilityContributions)
+    mergeHistoryContributions(result.historyContributions)
+
+_describeActionCache: Dict[Tuple, ActionDescription] = {}
+_ACTION_RESULT_CACHES.append(_describeActionCache)
+
+# (proto name, action): name of the god power the action's description includes, if any (devotion actions, see devoteMinorHandler)
+_describedGodPowers: Dict[Tuple, Union[str, None]] = {}
+_ACTION_RESULT_CACHES.append(_describedGodPowers)
+
+def _describedGodPower(proto: Union[str, ET.Element], action: Union[str, ET.Element]) -> Union[str, None]:
+    key = (proto if isinstance(proto, str) else proto.attrib.get("name"), action)
+    if key not in _describedGodPowers:
+        protoElem = common.protoFromName(proto)
+        actionElem = findActionByName(protoElem, action)
+        powerName = None
+        if protoElem is not None and actionElem is not None:
+            powerName = findFromActionOrTactics(actionElem, actionTactics(protoElem, actionElem), "devotionpower", None)
+        _describedGodPowers[key] = powerName
+    return _describedGodPowers[key]
+
+def describeActionResult(proto: Union[str, ET.Element], action: Union[str, ET.Element], chargeType: ActionChargeType=ActionChargeType.NONE, nameOverride: Union[str, None] = None, forceAbilityLink: Union[str, None] = None, overrideText: Union[str, None]=None, tech: Union[ET.Element, None]=None) -> ActionDescription:
+    "Describe an action without touching any global state: the ability string and history text contributions are returned for the caller to merge (see mergeContributions)."
+    # Devotion actions describe a god power, whose params are registered as generation goes. Only that power's params matter
+    key = (*_protoCacheKey(proto), action, chargeType, nameOverride, forceAbilityLink, overrideText, tech, godpower.godPowerProcessingParams.keyVersion(_describedGodPower(proto, action)))
+    cached = _describeActionCache.get(key)
+    if cached is not None:
+        return cached
+    collector = []
+    historyCollector = []
+    _abilityContributionCollectors.append(collector)
+    common.historyTextCollectors.append(historyCollector)
+    try:
+        text = _describeActionUncached(proto, action, chargeType, nameOverride, forceAbilityLink, overrideText, tech)
+    finally:
+        _abilityContributionCollectors.pop()
+        common.historyTextCollectors.pop()
+    history = tuple(HistoryTextContribution(objectName, objectType, addition if isinstance(addition, str) else tuple(addition)) for objectName, objectType, addition in historyCollector)
+    result = ActionDescription(text, tuple(collector), history)
+    _describeActionCache[key] = result
+    return result
+
+def describeAction(proto: Union[str, ET.Element], action: Union[str, ET.Element], chargeType: ActionChargeType=ActionChargeType.NONE, nameOverride: Union[str, None] = None, forceAbilityLink: Union[str, None] = None, overrideText: Union[str, None]=None, tech: Union[ET.Element, None]=None) -> str:
+    "Describe an action and merge its ability string and history text contributions straight away."
+    result = describeActionResult(proto, action, chargeType, nameOverride, forceAbilityLink, overrideText, tech)
+    mergeContributions(result)
+    return result.text
+
 #@functools.cache
-def getAnimFileSectionsForProtoAction(proto: Union[str, ET.Element], action: Union[str, ET.Element]) -> List[ET.Element]:
+def getAnimFileSectionsForProtoAction(proto: Union[str, ET.Element], action: Union[str, ET.Element]) -> List[animtiming.AnimInfoTiming]:
     proto = common.protoFromName(proto)
     action = findActionByName(proto, action)
     tactics = actionTactics(proto, action)
@@ -2532,17 +2674,18 @@ def getAnimFileSectionsForProtoAction(proto: Union[str, ET.Element], action: Uni
         return None
     animFile = animFile.text
 
-    animFileSection = globals.dataCollection["simdata.xml"].findall(f"animxml[@file='{animFile}']")
+    animFileSection = animtiming.animFileSections(animFile)
     if len(animFileSection) != 1:
         common.warn_unhandled(f"Found {len(animFileSection)} animfile sections for {proto.attrib['name']}'s {targetActionName}, expected exactly 1")
         return None
     
-    animMatches = animFileSection[0].findall(f"animations/animinfo[name='{targetActionName}']")
+    animMatches = animFileSection[0].get(targetActionName, [])
     if len(animMatches) < 1:
         #print(f"Unable to get any anim match for {proto.attrib['name']}'s {targetActionName}")
         return None
     return animMatches
 
+@cachedByProtoAndAction
 def getActionAttackCount(proto: Union[str, ET.Element], action: Union[str, ET.Element]):
     "Return the number of times a given action makes attack tag attempts in its animation data."
     proto = common.protoFromName(proto)
@@ -2554,9 +2697,8 @@ def getActionAttackCount(proto: Union[str, ET.Element], action: Union[str, ET.El
         
     versionCounts = []
     for animMatch in animMatches:
-        versions = animMatch.findall("versions/version")
-        for version in versions:
-            versionCounts.append(len(version.findall("tags/tag[type='Attack']")))
+        for version in animMatch:
+            versionCounts.append(version.attackTagCount)
 
     if len(versionCounts) == 0:
         common.warn_data(f"Found no attack tags for {proto.attrib['name']}'s {findFromActionOrTactics(action, tactics, 'name')}")
@@ -2590,13 +2732,12 @@ def getActionAttackPointTimesInAnimation(proto: Union[str, ET.Element], action:
     out = []
 
     for animMatch in animMatches:
-        versions = animMatch.findall("versions/version")
-        for version in versions:
-            length = common.findAndFetchText(version, "duration", None, float)
+        for version in animMatch:
+            length = version.duration
             if length is None:
                 continue
             # Pretty basic testing says that the attack tag is already the percentage, need to convert to actual time
-            attackPositions = [length*float(elem.text) for elem in version.findall("tags/tag[type='Attack']/position")]
+            attackPositions = [length*position for position in version.attackPositions]
             out.append(AnimationAttackPositionInfo(length=length, attackPositions=attackPositions))
     
     return out
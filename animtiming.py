@@ -0,0 +1,60 @@
+import globals
+import common
+import dataclasses
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple, Union
+
+# The only thing anything reads out of simdata.xml is attack timing: for each animxml file, each animinfo's versions' durations and Attack tags.
+# That gets pulled out into this index so the (very large) tree doesn't need to be kept around.
+
+@dataclasses.dataclass
+class AnimVersionTiming:
+    duration: Union[float, None]
+    # Positions of the Attack tags as fractions of the animation, in file order
+    attackPositions: Tuple[float, ...]
+    # Number of Attack tags, whether or not they have a position
+    attackTagCount: int
+
+# One entry per animinfo: the timings of all its versions
+AnimInfoTiming = List[AnimVersionTiming]
+
+# animxml file: one dict per animxml section with that file (there should only ever be one), of animinfo name: animinfos with that name
+AnimAttackIndex = Dict[str, List[Dict[str, List[AnimInfoTiming]]]]
+
+def versionTiming(version: ET.Element) -> AnimVersionTiming:
+    attackTags = version.findall("tags/tag[type='Attack']")
+    positions = tuple(float(position.text) for tag in attackTags for position in tag.findall("position"))
+    return AnimVersionTiming(common.findAndFetchText(version, "duration", None, float), positions, len(attackTags))
+
+def addAnimInfoTiming(section: Dict[str, List[AnimInfoTiming]], animInfo: ET.Element):
+    timing = [versionTiming(version) for version in animInfo.findall("versions/version")]
+    # An animinfo can answer to more than one name
+    for name in dict.fromkeys(elem.text for elem in animInfo.findall("name")):
+        section.setdefault(name, []).append(timing)
+
+# Builds the index straight from the file without ever holding the whole tree: each animinfo is read as soon as it's complete, then everything parsed so far is thrown away
+def loadAnimAttackIndex(path: str) -> AnimAttackIndex:
+    index = {}
+    section = None
+    # Tags of the currently open elements, root first
+    openTags = []
+    root = None
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            openTags.append(elem.tag)
+            if len(openTags) == 2 and elem.tag == "animxml":
+                section = {}
+                index.setdefault(elem.attrib.get("file"), []).append(section)
+            continue
+        openTags.pop()
+        if len(openTags) == 3 and elem.tag == "animinfo" and openTags[1:] == ["animxml", "animations"]:
+            addAnimInfoTiming(section, elem)
+            elem.clear()
+        elif len(openTags) == 1:
+            root.clear()
+    return index
+
+def animFileSections(animFile: str) -> List[Dict[str, List[AnimInfoTiming]]]:
+    return globals.animAttackIndex.get(animFile, [])
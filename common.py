@@ -6,8 +6,9 @@ import os
 import re
 import itertools
 import dataclasses
-import warnings
+import diagnostics
 import functools
+import xmlbackend
 
 def commaSeparatedList(words: List[str], joiner="and", sep=", "):
     if isinstance(words, str):
@@ -22,12 +23,12 @@ def commaSeparatedList(words: List[str], joiner="and", sep=", "):
 
 
 def protoFromName(protoName: Union[ET.Element, str]) -> Union[ET.Element, None]:
-    if isinstance(protoName, ET.Element):
+    if isinstance(protoName, xmlbackend.ELEMENT_TYPES):
         return protoName
     return globals.dataCollection["proto.xml"].find(f"./*[@name='{protoName}']")
 
 def techFromName(techName: Union[ET.Element, str]) -> Union[ET.Element, None]:
-    if isinstance(techName, ET.Element):
+    if isinstance(techName, xmlbackend.ELEMENT_TYPES):
         return techName
     return globals.dataCollection["techtree.xml"].find(f"./*[@name='{techName}']")
 
@@ -425,7 +426,7 @@ def _getDisplayNamesFromAbstractClass(abstract: str, plural=False) -> List[str]:
 
 def getListOfDisplayNamesForProtoOrClass(protoOrAbstract: Union[str, ET.Element, Iterable[Union[str, ET.Element]]], plural=False) -> List[str]:
     "Return a not-yet-joined user-facing display name encompassing a Protounit, abstract type, or list of any combination of these."
-    if not isinstance(protoOrAbstract, str) and not isinstance(protoOrAbstract, ET.Element):
+    if not isinstance(protoOrAbstract, str) and not isinstance(protoOrAbstract, xmlbackend.ELEMENT_TYPES):
         # Assumed: some iterable combination of the two
         workingList = []
         for item in protoOrAbstract:
@@ -474,9 +475,96 @@ def findAndFetchText(root: ET.Element, query: str, default, convert=None):
 
 
 
+# Lists that get (registry, key) for every VersionedRegistry entry looked up while they're here, innermost last.
+# So output built from a registry can tell exactly which of its entries it depended on (see tech.processTech)
+registryReadRecorders: List[list] = []
+
+class VersionedRegistry(dict):
+    "A dict that counts its writes, so cached output built from its entries can tell when one has been added or replaced."
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Bumped on every write to any key
+        self.version = 0
+        self._keyVersions: Dict[str, int] = {}
+
+    def _written(self, key):
+        self.version += 1
+        self._keyVersions[key] = self.version
+
+    def _read(self, key):
+        for recorder in registryReadRecorders:
+            recorder.append((self, key))
+
+    # Stands for the registry as a whole in keyVersion, for output that can depend on any entry (including ones that don't exist yet)
+    ALL_KEYS = object()
+
+    # The version at which key was last written, 0 if it never has been. Caches keyed on this depend on the entry as much as anything that reads it
+    def keyVersion(self, key) -> int:
+        self._read(key)
+        if key is VersionedRegistry.ALL_KEYS:
+            return self.version
+        return self._keyVersions.get(key, 0)
+
+    def __getitem__(self, key):
+        self._read(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._read(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self._read(key)
+        return super().__contains__(key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._written(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._written(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        if key in self:
+            self._written(key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._written(key)
+        return key, value
+
+    def clear(self):
+        for key in list(self.keys()):
+            del self[key]
+
+    # Pickle (eg sending to spawned worker processes) would otherwise set items before the counters exist
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+# Lists that collect history text additions in place of writing them, innermost last
+historyTextCollectors: List[list] = []
+
+# Lists that get a record of every ability string and history text addition made while they're here, so they can be replayed later (see descriptioncache.py)
+sideEffectRecorders: List[list] = []
+
 def addToGlobalAbilityStrings(proto: Union[str, ET.Element], abilityNode: ET.Element, value: str):
+    addToGlobalAbilityStringsById(proto, findAndFetchText(abilityNode, "rolloverid", None), value)
+
+def addToGlobalAbilityStringsById(proto: Union[str, ET.Element], strId: Union[str, None], value: str):
     proto = protoFromName(proto)
-    strId = findAndFetchText(abilityNode, "rolloverid", None)
+    for recorder in sideEffectRecorders:
+        recorder.append(["ability", None if proto is None else proto.attrib["name"], strId, value])
     if strId not in globals.unitAbilityDescriptions:
         globals.unitAbilityDescriptions[strId] = {}
     if not value in globals.unitAbilityDescriptions[strId].values():
@@ -546,6 +634,12 @@ def prependTextToHistoryFile(objectName: str, objectType: str, text: Union[str,
     objectName should be the proto/techtree tech name of the thing being modified.
     
     Fails if there is no history file for the given object."""
+    # Inside an action description, this becomes part of its result instead (see action.describeActionResult)
+    if historyTextCollectors:
+        historyTextCollectors[-1].append((objectName, objectType, text))
+        return
+    for recorder in sideEffectRecorders:
+        recorder.append(["history", objectName, objectType, text])
 
     historyFile = os.path.join(globals.historyPath, objectType, f"{objectName}.txt")
     if not os.path.isfile(historyFile):
@@ -579,10 +673,10 @@ def prependTextToHistoryFile(objectName: str, objectType: str, text: Union[str,
 
 def findGodPowerByName(powerName: Union[str, ET.Element]) -> ET.Element:
     if isinstance(powerName, str):
-        elem = globals.dataCollection["god_powers_combined"].find(f"power[@name='{powerName}']")
+        elem = globals.abilityIndex.godPower(powerName)
         if elem is not None:
             return elem
-        return globals.dataCollection["abilities_combined"].find(f"power[@name='{powerName}']")
+        return globals.abilityIndex.power(powerName)
     return powerName
 
 def collapseSpaces(string: str) -> str:
@@ -731,15 +825,15 @@ class UnhandledImplementationWarning(UserWarning):
 
 def warn_data(msg: str):
     "Warning for when something in the data files seems to be clearly at fault."
-    warnings.warn(msg, DataWarning, stacklevel=2)
+    diagnostics.collector.record(DataWarning, msg)
 
 def warn(msg: str):
     "Generic warning."
-    warnings.warn(msg, stacklevel=2)
+    diagnostics.collector.record(UserWarning, msg)
 
 def warn_unhandled(msg: str):
     "Warning for unhandled cases of data which is quite possibly valid - eg new kinds of tech subtypes, or attributes on things for which there was no reason to write handling before."
-    warnings.warn(msg, UnhandledImplementationWarning, stacklevel=2)
+    diagnostics.collector.record(UnhandledImplementationWarning, msg)
 
 def groupElementListBySameTextValues[T](elements: List[ET.Element], targetAttribute: str, textConversionFunction: Callable[[str], T]) -> Dict[T, List[str]]:
     """
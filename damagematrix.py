@@ -0,0 +1,165 @@
+import globals
+import action
+import stattable
+import array
+import csv
+import dataclasses
+import math
+from common import findAndFetchText
+from typing import Dict, List, Tuple, Union, Callable
+
+# Attack x target damage, from base data only: the damage types of each attack, its damagebonus entries and projectile count,
+# against the armor of every target in the stat table.
+# Rows (and their time to kill) are filled in lazily per attack, each one as whole column operations over the targets.
+# numpy is optional: with it those are vectorised, without it the same thing is done with array.array one element at a time.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DAMAGE_TYPES = ("Hack", "Pierce", "Crush", "Divine")
+
+@dataclasses.dataclass
+class Attack:
+    proto: str
+    actionName: str
+    # Already multiplied by projectile count (and divided by rof for DPS matrices)
+    damage: Dict[str, float]
+    # (unittype or proto name, multiplier)
+    bonuses: List[Tuple[str, float]]
+    active: bool
+
+    def label(self):
+        return f"{self.proto}:{self.actionName}"
+
+def attacksForProto(protoName: str, isDPS=True) -> List[Attack]:
+    record = globals.protoRecords[protoName]
+    proto = record.element
+    actions = list(record.actions)
+    protoActionNames = {findAndFetchText(x, "name", None) for x in actions}
+    tacticsFile = action.actionTactics(proto, None)
+    if tacticsFile is not None:
+        actions += [x for x in tacticsFile.findall("action") if findAndFetchText(x, "name", None) not in protoActionNames]
+    attacks = []
+    for actionNode in actions:
+        damageNodes = actionNode.findall("damage")
+        if len(damageNodes) == 0:
+            continue
+        tactics = action.actionTactics(proto, actionNode)
+        mult = action.actionDamageMultiplier(proto, actionNode, isDPS=isDPS)
+        damage = {}
+        for damageNode in damageNodes:
+            damageType = damageNode.attrib["type"]
+            damage[damageType] = damage.get(damageType, 0.0) + float(damageNode.text) * mult
+        bonuses = [(bonus.attrib["type"], float(bonus.text)) for bonus in actionNode.findall("damagebonus")]
+        active = action.findFromActionOrTactics(actionNode, tactics, "active", 1, int) > 0
+        attacks.append(Attack(protoName, findAndFetchText(actionNode, "name", "Unknown"), damage, bonuses, active))
+    return attacks
+
+def _defaultTargetFilter(protoName: str) -> bool:
+    table = globals.protoStatTable
+    return table.get(protoName, "maxhitpoints", 0.0) > 0.0 and not table.get(protoName, "invulnerable", 0.0)
+
+class DamageMatrix:
+    def __init__(self, attacks: List[Attack], targets: List[str]):
+        table = globals.protoStatTable
+        self.attacks = attacks
+        self.targets = targets
+        self.targetIndex: Dict[str, int] = {name:index for index, name in enumerate(targets)}
+        self.hitpoints = array.array("d", [table.get(name, "maxhitpoints", 0.0) for name in targets])
+        # Fraction of each damage type that gets through armor. Divine (and anything else without an armor column) isn't reduced
+        self.vulnerability: Dict[str, array.array] = {}
+        for damageType in DAMAGE_TYPES:
+            if damageType in stattable.ARMOR_TYPES:
+                self.vulnerability[damageType] = array.array("d", [1.0 - table.get(name, f"armor{damageType}", 0.0) for name in targets])
+            else:
+                self.vulnerability[damageType] = array.array("d", [1.0] * len(targets))
+        self.columnsByType: Dict[str, List[int]] = {}
+        for unitType, protos in globals.protosByUnitType.items():
+            columns = [self.targetIndex[proto] for proto in protos if proto in self.targetIndex]
+            if columns:
+                self.columnsByType[unitType] = columns
+        if numpy is not None:
+            self.hitpoints = numpy.asarray(self.hitpoints)
+            self.vulnerability = {damageType:numpy.asarray(values) for damageType, values in self.vulnerability.items()}
+        self._rows: Dict[int, array.array] = {}
+        self._timeToKill: Dict[int, array.array] = {}
+
+    def _bonusColumns(self, bonusType: str) -> List[int]:
+        columns = self.columnsByType.get(bonusType, [])
+        if bonusType in self.targetIndex:
+            columns = columns + [self.targetIndex[bonusType]]
+        return sorted(set(columns))
+
+    def row(self, attackIndex: int) -> array.array:
+        row = self._rows.get(attackIndex)
+        if row is not None:
+            return row
+        attack = self.attacks[attackIndex]
+        if numpy is not None:
+            row = numpy.zeros(len(self.targets))
+            for damageType, amount in attack.damage.items():
+                row += amount * self.vulnerability.get(damageType, self.vulnerability["Divine"])
+            # Each matching bonus multiplies in
+            for bonusType, mult in attack.bonuses:
+                columns = self._bonusColumns(bonusType)
+                if columns:
+                    row[columns] *= mult
+        else:
+            row = array.array("d", [0.0] * len(self.targets))
+            for damageType, amount in attack.damage.items():
+                vulnerability = self.vulnerability.get(damageType, self.vulnerability["Divine"])
+                row = array.array("d", [existing + amount * vuln for existing, vuln in zip(row, vulnerability)])
+            for bonusType, mult in attack.bonuses:
+                for column in self._bonusColumns(bonusType):
+                    row[column] *= mult
+        self._rows[attackIndex] = row
+        return row
+
+    def timeToKill(self, attackIndex: int) -> array.array:
+        ttk = self._timeToKill.get(attackIndex)
+        if ttk is not None:
+            return ttk
+        row = self.row(attackIndex)
+        if numpy is not None:
+            ttk = numpy.full(len(self.targets), math.inf)
+            numpy.divide(self.hitpoints, row, out=ttk, where=row > 0.0)
+        else:
+            ttk = array.array("d", [hp/damage if damage > 0.0 else math.inf for hp, damage in zip(self.hitpoints, row)])
+        self._timeToKill[attackIndex] = ttk
+        return ttk
+
+    def attackIndexes(self, protoName: str, actionName: Union[str, None]=None) -> List[int]:
+        return [index for index, attack in enumerate(self.attacks) if attack.proto == protoName and (actionName is None or attack.actionName.lower() == actionName.lower())]
+
+    # Returns [(target, time to kill)] sorted fastest first if best, slowest first otherwise. Targets that can't be damaged at all are left out
+    def matchups(self, attackIndex: int, count: int=5, best: bool=True, targetFilter: Union[None, Callable[[str], bool]]=None) -> List[Tuple[str, float]]:
+        timeToKill = self.timeToKill(attackIndex)
+        if numpy is not None:
+            candidates = numpy.flatnonzero(numpy.isfinite(timeToKill))
+        else:
+            candidates = [index for index, ttk in enumerate(timeToKill) if ttk != math.inf]
+        results = [(self.targets[index], float(timeToKill[index])) for index in candidates if targetFilter is None or targetFilter(self.targets[index])]
+        results.sort(key=lambda x: x[1], reverse=not best)
+        return results[:count]
+
+    def writeCounterTable(self, path: str, timeToKill: bool=True, activeOnly: bool=True):
+        with open(path, "w", newline="", encoding="utf8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Attack"] + self.targets)
+            for index, attack in enumerate(self.attacks):
+                if activeOnly and not attack.active:
+                    continue
+                values = self.timeToKill(index) if timeToKill else self.row(index)
+                writer.writerow([attack.label()] + [f"{value:0.4g}" for value in values])
+
+def buildDamageMatrix(attackers: Union[List[str], None]=None, targets: Union[List[str], None]=None, isDPS: bool=True) -> DamageMatrix:
+    if attackers is None:
+        attackers = list(globals.protoRecords.keys())
+    if targets is None:
+        targets = [name for name in globals.protoRecords.keys() if _defaultTargetFilter(name)]
+    attacks = []
+    for attacker in attackers:
+        attacks += attacksForProto(attacker, isDPS=isDPS)
+    return DamageMatrix(attacks, targets)
@@ -0,0 +1,213 @@
+import globals
+import common
+import xmlbackend
+import action
+import dataclasses
+import enum
+import functools
+import hashlib
+import json
+import os
+import types
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, List, Union
+
+# Optional persistent cache of generated unit and tech descriptions (python main.py --cache <dir>).
+# Entries are content addressed: the key is a hash of the entity's XML, its tactics file (for protos), its override definition,
+# any extra generation state the caller passes in, a stamp of the generator code itself (every .py file next to this one),
+# and a stamp of every input file (the gameplay data, the string table and game.cfg) plus the config options.
+# Descriptions also read data belonging to other entities (eg spawned units' names, unit type resolution, values the override setup
+# pulled off other protos), so any change to the game data invalidates everything, same as editing the code does.
+# What the cache saves is rebuilding with the same code and data, eg a --only build after a full one, or an unchanged patch.
+#
+# Ability string and history text additions made while generating are stored with the text and replayed on a hit.
+# Warnings aren't, so a build served mostly from cache reports fewer of them.
+
+# Bump to throw away every existing entry, eg if the entry format changes
+CACHE_FORMAT = 1
+
+cacheDir: Union[str, None] = None
+_codeStamp: Union[str, None] = None
+_inputStamp: Union[str, None] = None
+# Lowercase tactics filename: hash of its contents
+_tacticsHashes = {}
+
+def enable(path: str):
+    global cacheDir
+    cacheDir = path
+    os.makedirs(cacheDir, exist_ok=True)
+
+def codeStamp() -> str:
+    global _codeStamp
+    if _codeStamp is None:
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode("utf8"))
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".py"):
+                digest.update(filename.encode("utf8"))
+                with open(os.path.join(directory, filename), "rb") as f:
+                    digest.update(f.read())
+        _codeStamp = digest.hexdigest()
+    return _codeStamp
+
+def _addFileToDigest(digest, path: str, name: str):
+    digest.update(name.encode("utf8"))
+    if not os.path.isfile(path):
+        digest.update(b"<missing>")
+        return
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+def inputStamp() -> str:
+    global _inputStamp
+    if _inputStamp is None:
+        digest = hashlib.sha256()
+        paths = globals.config["paths"]
+        gameplayDir = os.path.join(paths["dataPath"], "game/data/gameplay")
+        for directory, subdirs, filenames in os.walk(gameplayDir):
+            subdirs.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                _addFileToDigest(digest, path, os.path.relpath(path, gameplayDir))
+        _addFileToDigest(digest, os.path.join(paths["dataPath"], "game/data/strings", paths["lang"], "string_table.txt"), "string_table.txt")
+        _addFileToDigest(digest, os.path.join(paths["configPath"], "game.cfg"), "game.cfg")
+        if globals.config.has_section("options"):
+            digest.update(repr(sorted(globals.config["options"].items())).encode("utf8"))
+        _inputStamp = digest.hexdigest()
+    return _inputStamp
+
+# id: (element, hash). The data doesn't change once generation starts
+_elementHashes = {}
+
+def _elementHash(elem: ET.Element) -> str:
+    entry = _elementHashes.get(id(elem))
+    if entry is None:
+        entry = (elem, hashlib.sha256(_elementBytes(elem)).hexdigest())
+        _elementHashes[id(elem)] = entry
+    return entry[1]
+
+def _elementBytes(elem: ET.Element) -> bytes:
+    if xmlbackend.isLxmlElement(elem):
+        return xmlbackend.lxmlEtree.tostring(elem)
+    return ET.tostring(elem)
+
+# How far fingerprint goes into nested plain containers and dataclasses before giving up on a stable key
+MAX_FINGERPRINT_DEPTH = 8
+
+def fingerprint(obj: Any, depth: int=0) -> str:
+    "A description of obj that's the same from run to run, unlike repr for anything containing functions. Only needs to be good enough to tell override definitions apart."
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes, enum.Enum)):
+        return repr(obj)
+    if isinstance(obj, types.ModuleType):
+        return f"<module {obj.__name__}>"
+    if isinstance(obj, type):
+        return f"<class {obj.__module__}.{obj.__qualname__}>"
+    if isinstance(obj, xmlbackend.ELEMENT_TYPES):
+        return f"<xml {_elementHash(obj)}>"
+    if isinstance(obj, (types.FunctionType, types.BuiltinFunctionType)):
+        return _callableFingerprint(obj)
+    if depth >= MAX_FINGERPRINT_DEPTH:
+        return _unstableFingerprint(obj)
+    depth += 1
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join(fingerprint(item, depth) for item in obj) + "]"
+    if isinstance(obj, (set, frozenset)):
+        return "{" + ",".join(sorted(fingerprint(item, depth) for item in obj)) + "}"
+    if isinstance(obj, dict):
+        return "{" + ",".join(sorted(f"{fingerprint(key, depth)}:{fingerprint(value, depth)}" for key, value in obj.items())) + "}"
+    if isinstance(obj, functools.partial):
+        return f"<partial {fingerprint(obj.func, depth)} {fingerprint(obj.args, depth)} {fingerprint(obj.keywords, depth)}>"
+    if isinstance(obj, types.MethodType):
+        return f"<method {_callableFingerprint(obj.__func__)} of {fingerprint(obj.__self__, depth)}>"
+    if dataclasses.is_dataclass(obj):
+        return f"{type(obj).__qualname__}(" + ",".join(f"{field.name}={fingerprint(getattr(obj, field.name), depth)}" for field in dataclasses.fields(obj)) + ")"
+    return _unstableFingerprint(obj)
+
+# Functions are identified by name and code only. Whatever they close over or default to isn't looked at:
+# that's built from the generator code or the data files (often other entities' data), which the code and input stamps cover
+def _callableFingerprint(func: Callable) -> str:
+    code = getattr(func, "__code__", None)
+    name = f"{getattr(func, '__module__', None)}.{getattr(func, '__qualname__', type(func).__qualname__)}"
+    if code is None:
+        return f"<function {name}>"
+    return f"<function {name} {_codeHash(code)}>"
+
+# code object: hash of its bytecode, names and constants (including nested functions')
+_codeHashes: Dict[types.CodeType, str] = {}
+
+def _codeHash(code: types.CodeType) -> str:
+    codeHash = _codeHashes.get(code)
+    if codeHash is None:
+        consts = [_codeHash(const) if isinstance(const, types.CodeType) else _constFingerprint(const) for const in code.co_consts]
+        codeHash = hashlib.sha256(code.co_code + repr((code.co_names, consts)).encode("utf8")).hexdigest()
+        _codeHashes[code] = codeHash
+    return codeHash
+
+def _constFingerprint(const: Any) -> str:
+    # Constant frozensets (eg "x in {'a', 'b'}") repr in hash order, which changes from run to run for strings
+    if isinstance(const, frozenset):
+        return "{" + ",".join(sorted(_constFingerprint(item) for item in const)) + "}"
+    if isinstance(const, tuple):
+        return "(" + ",".join(_constFingerprint(item) for item in const) + ")"
+    return repr(const)
+
+def _unstableFingerprint(obj: Any) -> str:
+    # Anything else has no stable identity to key on: include its address, which just means it never gets a cache hit
+    return f"<{type(obj).__qualname__} at {id(obj):#x}>"
+
+def _tacticsHash(proto: ET.Element) -> str:
+    tacticsNode = proto.find("tactics")
+    if tacticsNode is None:
+        return ""
+    filename = tacticsNode.text.lower()
+    if filename not in _tacticsHashes:
+        tactics = globals.dataCollection["tactics"].get(filename)
+        _tacticsHashes[filename] = "" if tactics is None else _elementHash(tactics)
+    return _tacticsHashes[filename]
+
+def entryKey(kind: str, element: ET.Element, keyParts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in (codeStamp(), inputStamp(), kind, globals.config["paths"]["lang"], _elementHash(element), _tacticsHash(element) if kind == "unit" else "", fingerprint(keyParts)):
+        if isinstance(part, str):
+            part = part.encode("utf8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def _entryPath(key: str) -> str:
+    return os.path.join(cacheDir, key[:2], f"{key}.json")
+
+def replaySideEffects(sideEffects: List[list]):
+    for sideEffect in sideEffects:
+        if sideEffect[0] == "ability":
+            common.addToGlobalAbilityStringsById(*sideEffect[1:])
+        elif sideEffect[0] == "history":
+            common.prependTextToHistoryFile(*sideEffect[1:])
+
+def cached(kind: str, element: ET.Element, keyParts: Any, generate: Callable[[], Union[str, None]]) -> Union[str, None]:
+    "Return generate(), or its stored result (replaying its side effects) if this entity has been generated with the same inputs before."
+    # Inside an action description, ability strings and history text get collected rather than added, which can't be replayed
+    if cacheDir is None or action.contributionsAreBeingCollected():
+        return generate()
+    key = entryKey(kind, element, keyParts)
+    path = _entryPath(key)
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf8") as f:
+            entry = json.load(f)
+        replaySideEffects(entry["sideEffects"])
+        return entry["text"]
+    recorder = []
+    common.sideEffectRecorders.append(recorder)
+    try:
+        text = generate()
+    finally:
+        common.sideEffectRecorders.pop()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so an interrupted build can't leave a half written entry.
+    # The temp name is per process: parallel tech workers can generate the same entry at once
+    tempPath = f"{path}.{os.getpid()}.tmp"
+    with open(tempPath, "w", encoding="utf8") as f:
+        json.dump({"text":text, "sideEffects":recorder}, f, ensure_ascii=False)
+    os.replace(tempPath, path)
+    return text
@@ -0,0 +1,90 @@
+import sys
+import json
+import os
+import dataclasses
+from typing import Dict, List, Tuple, Type, Union
+
+# Replaces routing every warning through warnings.warn: messages are deduplicated by (category, message) and just counted after the first.
+# The first occurrence of each is still printed as it happens (in the same format warnings used), in case the build dies partway.
+
+@dataclasses.dataclass
+class Diagnostic:
+    category: str
+    message: str
+    count: int
+    # file:line of the first caller
+    source: str
+
+class DiagnosticsCollector:
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str], Diagnostic] = {}
+        # Lists that get a copy (count 1) of every occurrence recorded or merged while they're here, so eg a cached result can give its warnings again (see action.cachedByProtoAndAction)
+        self.recorders: List[List[Diagnostic]] = []
+
+    def record(self, category: Union[str, Type[Warning]], message: str, stacklevel: int=2):
+        if not isinstance(category, str):
+            category = category.__name__
+        key = (category, message)
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.count += 1
+        else:
+            # Only pay for looking up the caller once per unique message
+            frame = sys._getframe(stacklevel)
+            source = f"{frame.f_code.co_filename}:{frame.f_lineno}"
+            entry = Diagnostic(category, message, 1, source)
+            self.entries[key] = entry
+            print(f"{source}: {category}: {message}", file=sys.stderr)
+        for recorder in self.recorders:
+            recorder.append(dataclasses.replace(entry, count=1))
+
+    # Adds entries collected somewhere else (eg a worker process). Their first occurrences were already printed there
+    def merge(self, entries: List[Diagnostic]):
+        for entry in entries:
+            existing = self.entries.get((entry.category, entry.message))
+            if existing is not None:
+                existing.count += entry.count
+            else:
+                self.entries[(entry.category, entry.message)] = dataclasses.replace(entry)
+            for recorder in self.recorders:
+                recorder.append(dataclasses.replace(entry))
+
+    # Count of every entry as it is now, for entriesSince
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        return {key:entry.count for key, entry in self.entries.items()}
+
+    # Entries given since counts() returned countsBefore, counting only the occurrences after that. Eg what a forked worker has to send back to be merged:
+    # it starts with a copy of everything the parent had already collected
+    def entriesSince(self, countsBefore: Dict[Tuple[str, str], int]) -> List[Diagnostic]:
+        return [dataclasses.replace(entry, count=entry.count - countsBefore.get(key, 0)) for key, entry in self.entries.items() if entry.count > countsBefore.get(key, 0)]
+
+    def sortedEntries(self):
+        return sorted(self.entries.values(), key=lambda x: (x.category, -x.count, x.message))
+
+    def printSummary(self):
+        if not self.entries:
+            return
+        countsByCategory = {}
+        for entry in self.entries.values():
+            countsByCategory[entry.category] = countsByCategory.get(entry.category, 0) + entry.count
+        print(f"Build produced {len(self.entries)} distinct warnings ({sum(countsByCategory.values())} total):")
+        for category, count in sorted(countsByCategory.items()):
+            print(f"  {category}: {count}")
+        for entry in self.sortedEntries():
+            repeats = f" (x{entry.count})" if entry.count > 1 else ""
+            print(f"  [{entry.category}]{repeats} {entry.message}")
+
+    def writeReport(self, path: str):
+        with open(path, "w", encoding="utf8") as f:
+            json.dump([dataclasses.asdict(entry) for entry in self.sortedEntries()], f, indent=1)
+
+    def clear(self):
+        self.entries = {}
+
+collector = DiagnosticsCollector()
+
+REPORT_PATH = "diagnostics.json"
+
+def finish(reportPath: str=REPORT_PATH):
+    collector.printSummary()
+    collector.writeReport(os.path.abspath(reportPath))
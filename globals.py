@@ -26,4 +26,22 @@ abstractTypes: Set[str] = set()
 
 protosByUnitType: Dict[str, List[str]] = {}
 
-godPowerRecharges: Dict[str, float] = {}
\ No newline at end of file
+godPowerRecharges: Dict[str, float] = {}
+
+# protoName: protorecord.ProtoUnitRecord, built once after load
+protoRecords: Dict[str, "protorecord.ProtoUnitRecord"] = {}
+
+# Column oriented base stats for all protos, see stattable.py
+protoStatTable: Union["stattable.ProtoStatTable", None] = None
+
+# Flattened effects of every tech, see techeffects.py
+techEffectTable: Union["techeffects.TechEffectTable", None] = None
+
+# Tech prerequisite/enabler graph, see techgraph.py
+techGraph: Union["techgraph.TechGraph", None] = None
+
+# Attack timing pulled out of simdata.xml, see animtiming.py
+animAttackIndex: "animtiming.AnimAttackIndex" = {}
+
+# Name lookups for protos and civ abilities, see abilityindex.py
+abilityIndex: Union["abilityindex.AbilityIndex", None] = None
@@ -5,7 +5,7 @@ import tech
 import action
 from xml.etree import ElementTree as ET
 import dataclasses
-from typing import Dict, List, Union, Callable
+from typing import Dict, List, Union, Callable, Iterable
 import icon
 import copy
 import math
@@ -61,7 +61,7 @@ class GodPowerParams:
     overrideCost: Union[str, None] = None
 
 
-godPowerProcessingParams: Dict[str, GodPowerParams] = {}
+godPowerProcessingParams: Dict[str, GodPowerParams] = common.VersionedRegistry()
 
 def getTechEffectHandlerResponseForGodPowerEffect(godpower: ET.Element, effect: ET.Element) -> Union[None, tech.EffectHandlerResponse]:
     # This is a little bit dirty...
@@ -209,13 +209,10 @@ def processGodPower(godpower: ET.Element) -> Union[None, str]:
 
 
 def findGodPowerRecharges():
-    techtree = globals.dataCollection["techtree.xml"]
-    for techElem in techtree:
-        grantPowers = techElem.findall("effects/effect[@subtype='GodPower']")
-        for granted in grantPowers:
-            if "cooldown" in granted.attrib:
-                powerName = granted.attrib['power']
-                globals.godPowerRecharges[powerName] = float(granted.attrib['cooldown'])
+    for granted in globals.techEffectTable.select(subtype="GodPower"):
+        if "cooldown" in granted.attrib:
+            powerName = granted.attrib['power']
+            globals.godPowerRecharges[powerName] = float(granted.attrib['cooldown'])
 
 
 # There's a bug that is making the damage interval of certain powers 50ms longer than the data would have you believe
@@ -257,7 +254,7 @@ def preloadGodPowerProcessing():
     godPowerProcessingParams["GreatTempleNewFireCeremony"] = GodPowerParams(newfireItems)
 
 
-def generateGodPowerDescriptions():
+def setupGodPowerOverrides():
     proto = globals.dataCollection["proto.xml"]
     techtree = globals.dataCollection["techtree.xml"]
     findGodPowerRecharges()
@@ -977,7 +974,7 @@ def generateGodPowerDescriptions():
 
     volcano = findGodPowerByName("Volcano")
     volcanoUnit = common.findAndFetchText(volcano, "createunit[.='Volcano']", "Volcano", str)
-    volcanoMeteorPower = globals.dataCollection["abilities_combined"].find("power[@name='AbilityVolcanoMeteor']")
+    volcanoMeteorPower = globals.abilityIndex.power("AbilityVolcanoMeteor")
     volcanoMeteorProto = common.findAndFetchText(volcanoMeteorPower, "meteorprotounit", "VolcanoMeteor", str)
     volcanoMeteorProtoElem = common.protoFromName(volcanoMeteorProto)
     volcanoMeteorAction = action.findActionByName(volcanoMeteorProtoElem, "HandAttack")
@@ -994,9 +991,8 @@ def generateGodPowerDescriptions():
     titangateItems = [f"Places a Titan Gate at 50% hitpoints. When fully built, unleashes a Titan.", "Can only be recast if you have a Wonder."]
     godPowerProcessingParams["TitanGate"] = GodPowerParams(titangateItems, overrideRecharge=titangateRecharge, overrideCost=titangateCost)
 
-
-    godpowers = globals.dataCollection["god_powers_combined"]
-
+# strid: {power: description} for the given powers, ready for handleSharedStringIDConflicts
+def godPowerDescriptionsByStringId(godpowers: Iterable[ET.Element]) -> Dict[str, Dict[ET.Element, str]]:
     stringIdsByOverwriters = {}
     for godpower in godpowers:
         strid = common.findAndFetchText(godpower, "rolloverid", None)
@@ -1008,5 +1004,9 @@ def generateGodPowerDescriptions():
                     stringIdsByOverwriters[strid] = {}
                 if value not in stringIdsByOverwriters[strid].values():
                     stringIdsByOverwriters[strid][godpower] = value
+    return stringIdsByOverwriters
 
+def generateGodPowerDescriptions():
+    setupGodPowerOverrides()
+    stringIdsByOverwriters = godPowerDescriptionsByStringId(globals.abilityIndex.godPowersInPrecedenceOrder())
     common.handleSharedStringIDConflicts(stringIdsByOverwriters)
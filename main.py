@@ -1,7 +1,9 @@
+import argparse
 import configparser
 import os
+import sys
 import xml.etree.ElementTree as ET
-from typing import Dict
+from typing import Dict, List, Tuple, Callable, Union, Iterable
 from unitdescription import generateUnitDescriptions
 from tech import generateTechDescriptions
 from godpower import generateGodPowerDescriptions
@@ -9,12 +11,25 @@ from majorgodtooltip import generateMajorGodDescriptions
 from aotg import generateBlessingDescriptions
 from loadingtips import generateLoadTips
 import godpower
+import tech
+import unitdescription
 import re
 import globals
 import json
 import datetime
 import common
 import action
+import protorecord
+import stattable
+import techeffects
+import techgraph
+import diagnostics
+import xmlprune
+import animtiming
+import xmlbackend
+import abilityindex
+import sqlitestore
+import descriptioncache
 
 def readConfig() -> configparser.ConfigParser: 
     fp = "config.ini"
@@ -37,17 +52,48 @@ def readStringTable(path) -> Dict[str, str]:
     return table
 
 def mergeXmls(parent: ET.Element, child: ET.Element):
-    for elem in child:
+    # With lxml, append moves the node out of child, so iterate over a copy
+    for elem in list(child):
         parent.append(elem)
 
+# Longer than this is almost always free text or a number list, which isn't worth sharing
+INTERN_MAX_LENGTH = 64
+
+def internStrings(root: ET.Element):
+    # The same unittype/flag/damage type/action names get repeated on huge numbers of nodes, and each file parses its own copies of them.
+    # Sharing one copy each cuts memory, and means the equality checks between them mostly succeed on identity straight away
+    intern = sys.intern
+    for elem in root.iter():
+        elem.tag = intern(elem.tag)
+        if elem.text is not None and len(elem.text) <= INTERN_MAX_LENGTH:
+            elem.text = intern(elem.text)
+        if elem.attrib:
+            elem.attrib = {intern(key):(intern(value) if len(value) <= INTERN_MAX_LENGTH else value) for key, value in elem.attrib.items()}
+
+def internDataCollection():
+    # After pruning, so this only goes over the files (and parts of them) that are kept.
+    # lxml hands out new strings every time text is read anyway
+    if xmlbackend.usingLxml:
+        return
+    for value in globals.dataCollection.values():
+        # Subdirectories (abilities, god_powers, tactics) are dicts of filename: tree
+        roots = value.values() if isinstance(value, dict) else (value,)
+        for root in roots:
+            if isinstance(root, xmlbackend.ELEMENT_TYPES):
+                internStrings(root)
+
 def loadXmls(gameplayDir):
     subpaths = ("", "abilities", "god_powers", "tactics")
     for subpath in subpaths:
         currentdir = os.path.join(gameplayDir, subpath)
         for xml in os.listdir(currentdir):
             filepath = os.path.join(currentdir, xml)
+            if subpath == "" and xml.lower() == "simdata.xml":
+                # Only attack timing gets read from this, and it's by far the biggest file - stream that out instead of keeping the tree
+                globals.animAttackIndex = animtiming.loadAnimAttackIndex(filepath)
+                continue
             if xml.endswith(".xml") or xml.endswith(".tactics") or xml.endswith(".abilities") or xml.endswith(".godpowers") or xml.endswith(".techtree"):
-                root = ET.parse(filepath).getroot()
+                root = xmlbackend.parse(filepath)
                 if subpath == "":
                     globals.dataCollection[xml.lower()] = root
                 else:
@@ -64,18 +110,9 @@ def loadXmls(gameplayDir):
 
 
 def mergeAbilities():
-    abilities = ET.Element("powers")
-    for filename in [x for x in list(globals.dataCollection["abilities"].keys()) if x.endswith(".abilities")]:
-        root = globals.dataCollection["abilities"][filename]
-        for child in root:
-            abilities.insert(0, child)
-    globals.dataCollection["abilities_combined"] = abilities
-    abilities = ET.Element("powers")
-    for filename in [x for x in list(globals.dataCollection["god_powers"].keys()) if x.endswith(".godpowers")]:
-        root = globals.dataCollection["god_powers"][filename]
-        for child in root:
-            abilities.insert(0, child)
-    globals.dataCollection["god_powers_combined"] = abilities
+    # Look powers up by name with globals.abilityIndex rather than find() on these, see abilityindex.py for which duplicate wins
+    globals.dataCollection["abilities_combined"] = abilityindex.mergePowerFiles(globals.dataCollection["abilities"], ".abilities")
+    globals.dataCollection["god_powers_combined"] = abilityindex.mergePowerFiles(globals.dataCollection["god_powers"], ".godpowers")
 
 def clarifyImplicitTechAbilities():
     """Some abilities (Demeter pack) aren't enabled with ActionEnable flags and are instead governed by the abilities xml making the button only appear with a researched tech
@@ -90,29 +127,25 @@ def clarifyImplicitTechAbilities():
                 if ability.find("alwaysdisabledingrid") is None:
                     #print(f"{protoNameElem.tag} has tech controlled nonpassive {ability.text}")
                     # Find the civ.abilities for this ability
-                    civability = globals.dataCollection['abilities_combined'].find(f"power[@name='{ability.text}']")
+                    civability = globals.abilityIndex.power(ability.text)
                     actionName = civability.find("unitaction").text
                     # See if the tech is enabling this already
                     enableElem = common.techFromName(techElem.text).find(f"effects/effect[@action='{actionName}']")
                     if enableElem is None:
                         print(f"{techElem.text} doesn't seem to have an ActionEnable for this")
-                        # Find the protounit entry for this ability - these are all lowercased (there's some evidence that it's by the developers' own internal tooling) so xpath searching to get them isn't possible
-                        proto = None
-                        for testProto in globals.dataCollection['proto.xml']:
-                            if testProto.attrib['name'].lower() == protoNameElem.tag:
-                                proto = testProto
-                                break
+                        # Find the protounit entry for this ability - these are all lowercased (there's some evidence that it's by the developers' own internal tooling) so a plain xpath search won't find them
+                        proto = globals.abilityIndex.protoCaseInsensitive(protoNameElem.tag)
                         if proto is not None:
                             print(f"{protoNameElem.tag} -> {proto.attrib['name']} has tech controlled nonpassive {ability.text} without ActionEnable")
                             actionElem = action.findActionByName(proto, actionName)
                             tactics = action.actionTactics(proto, actionElem)
                             if action.findFromActionOrTactics(actionElem, tactics, "enabled", 1, int) != 0:
-                                activeElem = ET.Element("active")
+                                activeElem = xmlbackend.makeElement("active")
                                 activeElem.text = "0"
                                 actionElem.insert(0, activeElem)
                                 print(f"-> added active=0 to {actionName} protoaction")
-                            enableEffect = ET.Element("effect", attrib={"type":"Data", "action":actionName, "subtype":"ActionEnable", "relativity":"Absolute", "amount":"1.0"})
-                            targetElement = ET.Element("target", attrib={"type":"ProtoUnit"})
+                            enableEffect = xmlbackend.makeElement("effect", attrib={"type":"Data", "action":actionName, "subtype":"ActionEnable", "relativity":"Absolute", "amount":"1.0"})
+                            targetElement = xmlbackend.makeElement("target", attrib={"type":"ProtoUnit"})
                             targetElement.text = proto.attrib['name']
                             enableEffect.insert(0, targetElement)
                             common.techFromName(techElem.text).find("effects").insert(0, enableEffect)
@@ -169,7 +202,10 @@ def parseUnitTypeData():
 def prepareData():
     globals.config = readConfig()
     gameplayDir = os.path.join(globals.config["paths"]["dataPath"], "game/data/gameplay")
+    xmlbackend.useBackend(globals.config.get("xml", "backend", fallback="elementtree"))
     loadXmls(gameplayDir)
+    xmlprune.pruneDataCollection()
+    internDataCollection()
     
     globals.dataCollection["string_table.txt"] = readStringTable(os.path.join(globals.config["paths"]["dataPath"], "game/data/strings", globals.config["paths"]["lang"], "string_table.txt"))
 
@@ -178,7 +214,12 @@ def prepareData():
         globals.dataCollection["string_table.txt"]["STR_ABILITY_PETRIFIED_FRAME"] = "Petrified Frame"
     parseUnitTypeData()
     mergeAbilities()
+    abilityindex.buildAbilityIndex()
     clarifyImplicitTechAbilities()
+    protorecord.buildProtoRecords()
+    stattable.buildProtoStatTable()
+    techeffects.buildTechEffectTable()
+    techgraph.buildTechGraph()
     loadGameCfg()
     globals.historyPath = os.path.join(globals.config["paths"]["dataPath"], "game/data/strings", globals.config["paths"]["lang"], "history")
 
@@ -199,24 +240,33 @@ def prepareData():
     common._UNIT_CLASS_LABELS_PLURAL["LogicalTypeMythUnitNotTitan"] = common._UNIT_CLASS_LABELS_PLURAL["LogicalTypeMythUnitNotTitan"].replace("LOGICAL_TYPE_MYTH_UNIT_NOT_TITAN_EXCEPTION", replacement)
     godpower.preloadGodPowerProcessing()
 
-def outputStrings():
+def finaliseStrings(stringIds: Union[Iterable[str], None]=None):
+    # Last step before writing out. With stringIds (for --only), only those are touched
+    if stringIds is None or "STR_HISTORY_HISTORY" in stringIds:
+        appendCompendiumText()
+    for strid in globals.historyTextStrings:
+        if stringIds is None or strid in stringIds:
+            globals.stringMap[strid] += "\\n"*3 + "----------\\n" + globals.dataCollection["string_table.txt"][strid]
 
+def appendCompendiumText():
     additionalCompendium = f"\\n\\nAdvanced Tooltips is active for (hopefully correct) additional information!\\nThis version was built on {datetime.datetime.now().strftime('%d %b %y')}. Game updates or data mods will make displayed values incorrect."
     additionalCompendium += "\\n\\nAll stats shown in tooltips are for the unit's base data - any techs that apply will NOT be included, including 'hidden' effects such as the bonuses from age advancement given to heroes and myth units.\\n\\n"
     additionalCompendium += f"\'Snares\' is used as a shorthand for the 'standard' slowing effect ({100*(1.0-action.STANDARD_SNARE['rate']):0.3g}% for {action.STANDARD_SNARE['duration']:0.3g} seconds) caused by nearly every melee attack in the game. Effects that slow movement by any other amount or duration will list their true numbers."
     globals.stringMap["STR_HISTORY_HISTORY"] = globals.dataCollection["string_table.txt"]["STR_HISTORY_HISTORY"] + additionalCompendium
-    
-    for strid in globals.historyTextStrings:
-        globals.stringMap[strid] += "\\n"*3 + "----------\\n" + globals.dataCollection["string_table.txt"][strid]
-    
-    with open(os.path.join(globals.config["paths"]["outputPath"], "game/data/strings/stringmods.txt"), "w", encoding="utf8") as f:
-        for strid, value in globals.stringMap.items():
-            f.write(f"ID = \"{strid}\"   ;   Str = \"{value}\"\n")
 
-def main():
-    print("Beginning build...")
-    prepareData()
+def outputStrings():
+    finaliseStrings()
+    writeStringMods(globals.stringMap)
 
+def stringModsPath() -> str:
+    return os.path.join(globals.config["paths"]["outputPath"], "game/data/strings/stringmods.txt")
+
+def writeStringMods(strings: Dict[str, str]):
+    with open(stringModsPath(), "w", encoding="utf8") as f:
+        for strid, value in strings.items():
+            f.write(f"ID = \"{strid}\"   ;   Str = \"{value}\"\n")
+
+def generateAll():
     generateTechDescriptions()           
     generateUnitDescriptions()
     generateGodPowerDescriptions()
@@ -224,8 +274,97 @@ def main():
     generateBlessingDescriptions()
     generateLoadTips()
 
+# Things that can be rebuilt on their own with --only: kind: (object lookup, rollover string id tag, collection of all objects of the kind, description generator)
+ONLY_BUILD_KINDS: Dict[str, Tuple[Callable[[str], Union[ET.Element, None]], str, Callable[[], Iterable[ET.Element]], Callable]] = {
+    "unit":(common.protoFromName, "rollovertextid", lambda: globals.dataCollection["proto.xml"], unitdescription.unitDescriptionsByStringId),
+    "tech":(common.techFromName, "rollovertextid", lambda: globals.dataCollection["techtree.xml"], tech.techDescriptionsByStringId),
+    "godpower":(common.findGodPowerByName, "rolloverid", lambda: globals.abilityIndex.godPowersInPrecedenceOrder(), godpower.godPowerDescriptionsByStringId),
+}
+
+def parseOnlyArgument(value: str) -> List[Tuple[str, str]]:
+    targets = []
+    for item in value.split(","):
+        kind, sep, name = item.strip().partition("=")
+        if not sep or kind not in ONLY_BUILD_KINDS or not name:
+            raise argparse.ArgumentTypeError(f"Bad --only entry '{item}': expected one of {', '.join(ONLY_BUILD_KINDS.keys())} followed by =name")
+        targets.append((kind, name))
+    return targets
+
+def buildOnly(targets: List[Tuple[str, str]]):
+    # Generators and override setup run in the same order as generateAll: later overrides depend on earlier ones, and text generated
+    # before some overrides exist in a full build (eg techs, before the unit and god power ones) must not see them here either.
+    # Only the string ids of the requested objects are regenerated and merged into the existing output.
+    # Shared ability strings and history text aren't touched: those combine input from many objects.
+    prepareData()
+    kinds = {kind for kind, name in targets}
+    rebuiltIds = set()
+    tech.findRespawnTechs()
+    tech.setupTechOverrides()
+    rebuildOnlyKind("tech", targets, rebuiltIds)
+    if kinds & {"unit", "godpower"}:
+        unitdescription.setupUnitOverrides()
+        rebuildOnlyKind("unit", targets, rebuiltIds)
+    # A full build drops the banned strings right after the unit descriptions, by which point the techs are done too
+    unitdescription.removeBannedStrings(rebuiltIds)
+    if "godpower" in kinds:
+        godpower.setupGodPowerOverrides()
+        rebuildOnlyKind("godpower", targets, rebuiltIds)
+        # The major god tooltips overwrite some god powers' text (the Chinese blessing "Techree" powers), so those come from there like in a full build.
+        # Everything else it writes isn't in rebuiltIds and gets thrown away
+        generateMajorGodDescriptions()
+    finaliseStrings(rebuiltIds)
+
+    existing = {}
+    if os.path.isfile(stringModsPath()):
+        existing = readStringTable(stringModsPath())
+    for rebuiltStrId in rebuiltIds:
+        if rebuiltStrId in globals.stringMap:
+            existing[rebuiltStrId] = globals.stringMap[rebuiltStrId]
+        else:
+            existing.pop(rebuiltStrId, None)
+    writeStringMods(existing)
+    diagnostics.finish()
+
+def rebuildOnlyKind(kind: str, targets: List[Tuple[str, str]], rebuiltIds: set):
+    lookup, stridTag, collection, generator = ONLY_BUILD_KINDS[kind]
+    for targetKind, name in targets:
+        if targetKind != kind:
+            continue
+        target = lookup(name)
+        if target is None:
+            raise ValueError(f"Couldn't find {kind} {name}")
+        strid = common.findAndFetchText(target, stridTag, None)
+        if strid is None:
+            raise ValueError(f"{kind} {name} has no {stridTag}, so has no tooltip to build")
+        # Everything else sharing this string id has to be redone too to resolve conflicts the same way as a full build
+        sharers = [elem for elem in collection() if common.findAndFetchText(elem, stridTag, None) == strid]
+        stringIdsByOverwriters = generator(sharers)
+        common.handleSharedStringIDConflicts(stringIdsByOverwriters)
+        for rebuiltStrId in stringIdsByOverwriters.keys():
+            rebuiltIds.add(rebuiltStrId)
+            print(f"Rebuilt {rebuiltStrId} ({kind} {name})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Advanced Tooltips string table mod")
+    parser.add_argument("--cache", default=None, help="Directory for a persistent cache of unit and tech descriptions, reused by later builds")
+    parser.add_argument("--jobs", type=int, default=0, help="Generate tech descriptions in this many worker processes (default: all in this one)")
+    parser.add_argument("--sqlite", default=None, help="Also write the prepared data and generated strings to this SQLite file")
+    parser.add_argument("--only", type=parseOnlyArgument, default=None, help="Only rebuild the given objects and merge them into the existing output, eg --only unit=Hoplite,tech=ArchaicAgeThor,godpower=Bolt")
+    args = parser.parse_args()
+    if args.cache is not None:
+        descriptioncache.enable(args.cache)
+    tech.parallelWorkers = args.jobs
+    if args.only is not None:
+        buildOnly(args.only)
+        return
+    print("Beginning build...")
+    prepareData()
+    generateAll()
+
     outputStrings()
-    
+    if args.sqlite is not None:
+        sqlitestore.writeStore(args.sqlite)
+    diagnostics.finish()
                         
     
     
@@ -25,9 +25,9 @@ def generateMajorGodDescriptions():
     globals.stringMap["STR_CIV_SET_LR"] = re.sub("reduce the cost of units in nearby (.*?) by", f"reduce the cost of Barracks and Migdol units in \\1 within {setMonumentRadius:0.3g}m by", setContent)
 
     thorContent = globals.dataCollection['string_table.txt']["STR_CIV_THOR_LR"]
-    thorTech = globals.dataCollection["techtree.xml"].find("tech[@name='ArchaicAgeThor']")
-    thorDwarfBuffMagnitude = list(set([float(x.attrib['amount']) for x in thorTech.findall("effects/effect[@subtype='WorkRate']")]))
-    thorDwarfBuffRestypes= [(x.attrib['unittype']) for x in thorTech.findall("effects/effect[@subtype='WorkRate']")]
+    thorWorkRateEffects = globals.techEffectTable.select(tech="ArchaicAgeThor", subtype="WorkRate")
+    thorDwarfBuffMagnitude = list(set([x.amount for x in thorWorkRateEffects]))
+    thorDwarfBuffRestypes= [(x.attrib['unittype']) for x in thorWorkRateEffects]
     if len(thorDwarfBuffMagnitude) != 1:
         raise ValueError(f"Bad thor dwarf buff magnitudes: {thorDwarfBuffMagnitude}")
     
@@ -117,12 +117,13 @@ def generateMajorGodDescriptions():
     globals.stringMap[common.findGodPowerByName("YinAndYangTechree").find("rolloverid").text] = yinyangTechtree
 
     nuwaContent = globals.dataCollection["string_table.txt"]["STR_CIV_NUWA_LR"]
-    nuwaAutobuildRate = 1.0 - float(common.techFromName("ArchaicAgeNuwa").find("effects/effect[@modifytype='AutoBuildRate']").attrib['amount'])
+    nuwaAutobuildRate = 1.0 - globals.techEffectTable.select(tech="ArchaicAgeNuwa", modifytype="AutoBuildRate")[0].amount
     nuwaContent = re.sub(f"Foundations automatically construct", f"Foundations (except Walls and Farms) automatically construct (at {nuwaAutobuildRate:0.3g} points/second)", nuwaContent)
     if "terracotta" not in nuwaContent.lower():
         # This bonus is currently missing
-        nuwaTerracottaEffect = common.techFromName("ArchaicAgeNuwa").find("effects/effect[@subtype='UnitRegenRate']")
-        if nuwaTerracottaEffect is not None:
+        nuwaTerracottaEffects = globals.techEffectTable.select(tech="ArchaicAgeNuwa", subtype="UnitRegenRate")
+        if nuwaTerracottaEffects:
+            nuwaTerracottaEffect = nuwaTerracottaEffects[0]
             amount = float(nuwaTerracottaEffect.attrib['amount'])
             baseAmount = -1.0*float(common.protoFromName("TerracottaRider").find("unitregen").text)
             if nuwaTerracottaEffect.attrib['relativity'] != "BasePercent":
@@ -152,7 +153,7 @@ def generateMajorGodDescriptions():
     globals.stringMap[common.findGodPowerByName("ShieldBlessingTechree").find("rolloverid").text] = shieldblessingTechtree
 
     shennongContent = globals.dataCollection["string_table.txt"]["STR_CIV_SHENNONG_LR"]
-    shennongFixedLandHealTargetElems = common.techFromName("ArchaicAgeShennong").findall("effects/effect[@subtype='BuildingChainEffect'][@modifytype='HealRate']")
+    shennongFixedLandHealTargetElems = globals.techEffectTable.select(tech="ArchaicAgeShennong", subtype="BuildingChainEffect", modifytype="HealRate")
     shennongFixedLandHealTargets = common.getDisplayNameForProtoOrClassPlural([elem.attrib['unittype'] for elem in shennongFixedLandHealTargetElems])
     shennongContent = shennongContent.replace("Myth units recover", shennongFixedLandHealTargets + " recover")
     globals.stringMap["STR_CIV_SHENNONG_LR"] = shennongContent
@@ -0,0 +1,21 @@
+import os
+import sys
+
+if not os.path.isdir("main.py"):
+    sys.path.append("./")
+
+import globals
+import main
+import damagematrix
+
+
+def countertable():
+    main.prepareData()
+    # Restrict to things that are actually trainable units, otherwise the table is full of props and SPC objects
+    units = [name for name, record in globals.protoRecords.items() if "Unit" in record.unittypes and not record.unittypes.isdisjoint(("LogicalTypeLandMilitary", "LogicalTypeNavalMilitary"))]
+    targets = [name for name in units if globals.protoStatTable.get(name, "maxhitpoints", 0.0) > 0.0]
+    matrix = damagematrix.buildDamageMatrix(attackers=units, targets=targets)
+    matrix.writeCounterTable("countertable.csv")
+
+if __name__ == "__main__":
+    countertable()
@@ -0,0 +1,147 @@
+import os
+import sys
+
+if not os.path.isdir("main.py"):
+    sys.path.append("./")
+
+import argparse
+import csv
+import dataclasses
+import json
+import globals
+import main
+import common
+import tech
+import stattable
+import techapply
+from typing import Any, Callable, Dict, Iterable, List
+
+# Runs any number of exporters over one prepared dataset, so that eg the spreadsheet and balance diff dumps don't each need their own cold start.
+# Each exporter yields one dict per row, which is written out as it comes (JSON Lines or CSV).
+#   python miscexports/exportengine.py                       (everything, as jsonl into ./exports)
+#   python miscexports/exportengine.py units techs --format csv --out somewhere
+
+@dataclasses.dataclass
+class Exporter:
+    name: str
+    # Column order for CSV output. JSON Lines rows are written as they come
+    columns: List[str]
+    rows: Callable[[], Iterable[Dict[str, Any]]]
+    # Whether this needs all the descriptions generated, or just the tech ones (which is a lot quicker)
+    needsFullBuild: bool = True
+
+def _tooltip(element, stridTag: str):
+    strid = common.findAndFetchText(element, stridTag, None)
+    if strid is None:
+        return None
+    return globals.stringMap.get(strid, None)
+
+def relicRows():
+    for relicNode in globals.dataCollection["relics.xml"]:
+        if "reserved" not in relicNode.attrib:
+            techName = relicNode.attrib["tech"]
+            techElem = common.techFromName(techName)
+            yield {"tech":techName, "name":common.getObjectDisplayName(techElem), "text":tech.processTech(techElem)}
+
+UNIT_STAT_COLUMNS = ["maxhitpoints", "los", "maxvelocity", "populationcount"] + [f"armor{armorType}" for armorType in stattable.ARMOR_TYPES]
+
+def unitRows():
+    table = globals.protoStatTable
+    for name, record in globals.protoRecords.items():
+        tooltip = _tooltip(record.element, "rollovertextid")
+        if tooltip is None:
+            continue
+        row = {"proto":name, "name":common.getObjectDisplayName(record.element)}
+        for column in UNIT_STAT_COLUMNS:
+            value = table.get(name, column, None)
+            # NaN isn't valid JSON
+            row[column] = None if value is None or value != value else value
+        for resource in ("food", "wood", "gold", "favor"):
+            row[f"cost{resource}"] = record.cost.get(resource.capitalize(), 0.0)
+        row["unittypes"] = " ".join(sorted(record.unittypes))
+        row["statupgrades"] = " ".join(techapply.statUpgradesForProto(name))
+        row["tooltip"] = tooltip
+        yield row
+
+def techRows():
+    graph = globals.techGraph
+    for techElem in globals.dataCollection["techtree.xml"]:
+        techName = techElem.attrib["name"]
+        tooltip = _tooltip(techElem, "rollovertextid")
+        if tooltip is None:
+            continue
+        row = {"tech":techName, "name":common.getObjectDisplayName(techElem)}
+        for resource in ("food", "wood", "gold", "favor"):
+            row[f"cost{resource}"] = graph.cost[techName].get(resource.capitalize(), 0.0)
+        row["researchtime"] = graph.researchTime[techName]
+        row["prereqs"] = " ".join(graph.parents[techName])
+        row["tooltip"] = tooltip
+        yield row
+
+def godPowerRows():
+    for power in globals.abilityIndex.godPowersInPrecedenceOrder():
+        tooltip = _tooltip(power, "rolloverid")
+        if tooltip is None:
+            continue
+        yield {"power":power.attrib["name"], "name":common.getObjectDisplayName(power), "cost":common.findAndFetchText(power, "cost", 0.0, float),
+               "repeatcost":common.findAndFetchText(power, "repeatcost", 0.0, float), "recharge":globals.godPowerRecharges.get(power.attrib["name"], None), "tooltip":tooltip}
+
+def blessingRows():
+    for effect in globals.dataCollection["aotg_effects.xml"]:
+        stringId = common.findAndFetchText(effect, "descriptionid", None)
+        if stringId is None or stringId not in globals.stringMap:
+            continue
+        yield {"effect":common.findAndFetchText(effect, "name", None), "tech":common.findAndFetchText(effect, "tech", None),
+               "rarity":common.findAndFetchText(effect, "rarity", None, int), "stringid":stringId, "tooltip":globals.stringMap[stringId]}
+
+EXPORTERS: Dict[str, Exporter] = {exporter.name:exporter for exporter in (
+    Exporter("relics", ["tech", "name", "text"], relicRows, needsFullBuild=False),
+    Exporter("units", ["proto", "name"] + UNIT_STAT_COLUMNS + ["costfood", "costwood", "costgold", "costfavor", "unittypes", "statupgrades", "tooltip"], unitRows),
+    Exporter("techs", ["tech", "name", "costfood", "costwood", "costgold", "costfavor", "researchtime", "prereqs", "tooltip"], techRows),
+    Exporter("godpowers", ["power", "name", "cost", "repeatcost", "recharge", "tooltip"], godPowerRows),
+    Exporter("blessings", ["effect", "tech", "rarity", "stringid", "tooltip"], blessingRows),
+)}
+
+def writeJsonLines(path: str, exporter: Exporter) -> int:
+    count = 0
+    with open(path, "w", encoding="utf8") as f:
+        for row in exporter.rows():
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+def writeCsv(path: str, exporter: Exporter) -> int:
+    count = 0
+    with open(path, "w", encoding="utf8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=exporter.columns)
+        writer.writeheader()
+        for row in exporter.rows():
+            writer.writerow(row)
+            count += 1
+    return count
+
+WRITERS = {"jsonl":writeJsonLines, "csv":writeCsv}
+
+def prepare(exporters: List[Exporter]):
+    main.prepareData()
+    if any(exporter.needsFullBuild for exporter in exporters):
+        main.generateAll()
+    else:
+        tech.generateTechDescriptions()
+
+def runExporters(exporters: List[Exporter], outputDir: str, format: str="jsonl"):
+    prepare(exporters)
+    os.makedirs(outputDir, exist_ok=True)
+    for exporter in exporters:
+        path = os.path.join(outputDir, f"{exporter.name}.{format}")
+        count = WRITERS[format](path, exporter)
+        print(f"Exported {count} {exporter.name} to {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export prepared game data and generated tooltips")
+    parser.add_argument("exporters", nargs="*", default=None, choices=list(EXPORTERS.keys()), help="Exporters to run, default all")
+    parser.add_argument("--format", choices=list(WRITERS.keys()), default="jsonl")
+    parser.add_argument("--out", default="exports")
+    args = parser.parse_args()
+    runExporters([EXPORTERS[name] for name in (args.exporters or EXPORTERS.keys())], args.out, args.format)
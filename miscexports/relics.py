@@ -4,21 +4,15 @@ import sys
 if not os.path.isdir("main.py"):
     sys.path.append("./")
 
-import tech
-import globals
-import main
-import common
+import exportengine
 
 
 def relics():
-    main.prepareData()
-    tech.generateTechDescriptions()
+    exporter = exportengine.EXPORTERS["relics"]
+    exportengine.prepare([exporter])
     out = {}
-    for relicNode in globals.dataCollection["relics.xml"]:
-        if "reserved" not in relicNode.attrib:
-            techName = relicNode.attrib["tech"]
-            techElem = globals.dataCollection["techtree.xml"].find(f"tech[@name='{techName}']")
-            out[common.getObjectDisplayName(techElem)] = tech.processTech(techElem)
+    for row in exporter.rows():
+        out[row["name"]] = row["text"]
 
     with open("relics.txt", "w") as f:
         for techName, content in out.items():
@@ -27,4 +21,4 @@ def relics():
             f.write("\n"*3)
 
 if __name__ == "__main__":
-    relics()
\ No newline at end of file
+    relics()
@@ -0,0 +1,76 @@
+import globals
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Union
+
+# Pre-parsed view of the bits of proto.xml that get read over and over by the generators.
+# Built once after the load-time XML edits (mergeAbilities, clarifyImplicitTechAbilities) are done, so it stays in sync with the tree.
+
+class ProtoUnitRecord:
+    __slots__ = ("element", "name", "maxhitpoints", "los", "maxvelocity", "armor", "rechargetime", "auxrechargetime",
+                 "recharge", "rechargetype", "auxrecharge", "auxrechargetype", "cost", "populationcount", "unittypes", "flags", "movementtype", "actions")
+    def __init__(self, proto: ET.Element):
+        self.element: ET.Element = proto
+        self.name: str = proto.attrib["name"]
+        self.maxhitpoints: float = _fetchFloat(proto, "maxhitpoints", 0.0)
+        self.los: Union[float, None] = _fetchFloat(proto, "los", None)
+        self.maxvelocity: float = _fetchFloat(proto, "maxvelocity", 0.0)
+        self.rechargetime: Union[float, None] = _fetchFloat(proto, "rechargetime", None)
+        self.auxrechargetime: Union[float, None] = _fetchFloat(proto, "auxrechargetime", None)
+        self.recharge: Union[float, None] = None
+        self.rechargetype: Union[str, None] = None
+        self.auxrecharge: Union[float, None] = None
+        self.auxrechargetype: Union[str, None] = None
+        # Like the XPath finds this replaces, first matching node wins
+        self.armor: Dict[str, float] = {}
+        self.cost: Dict[str, float] = {}
+        self.populationcount: float = _fetchFloat(proto, "populationcount", 0.0)
+        unittypes = []
+        flags = []
+        self.movementtype: Union[str, None] = None
+        self.actions: List[ET.Element] = []
+        for child in proto:
+            tag = child.tag
+            if tag == "unittype":
+                unittypes.append(child.text)
+            elif tag == "flag":
+                flags.append(child.text)
+            elif tag == "armor":
+                self.armor.setdefault(child.attrib["type"], float(child.attrib["value"]))
+            elif tag == "cost":
+                self.cost.setdefault(child.attrib["resourcetype"], float(child.text))
+            elif tag == "protoaction":
+                self.actions.append(child)
+            elif tag == "movementtype" and self.movementtype is None:
+                self.movementtype = child.text
+            elif tag == "recharge" and self.recharge is None:
+                self.recharge = float(child.text)
+                self.rechargetype = child.attrib.get("type", None)
+            elif tag == "auxrecharge" and self.auxrecharge is None:
+                self.auxrecharge = float(child.text)
+                self.auxrechargetype = child.attrib.get("type", None)
+        self.unittypes: frozenset[str] = frozenset(unittypes)
+        self.flags: frozenset[str] = frozenset(flags)
+
+    def hasUnitType(self, unitType: str) -> bool:
+        return unitType in self.unittypes
+
+    def hasFlag(self, flag: str) -> bool:
+        return flag in self.flags
+
+def _fetchFloat(proto: ET.Element, tag: str, default):
+    node = proto.find(tag)
+    if node is None or node.text is None:
+        return default
+    return float(node.text)
+
+def buildProtoRecords():
+    globals.protoRecords = {}
+    for proto in globals.dataCollection["proto.xml"]:
+        globals.protoRecords[proto.attrib["name"]] = ProtoUnitRecord(proto)
+
+# Returns None if the element isn't one of the loaded protos (eg a copied/modified element), callers should fall back to the XML
+def recordForProto(proto: ET.Element) -> Union[ProtoUnitRecord, None]:
+    record = globals.protoRecords.get(proto.attrib.get("name"))
+    if record is not None and record.element is proto:
+        return record
+    return None
@@ -0,0 +1,101 @@
+import globals
+import common
+import json
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from typing import Iterable, Tuple
+
+# Optional: writes the prepared data and the generated strings to a SQLite file for ad hoc querying (python main.py --sqlite tooltips.db), eg
+#   which units have a ChargedRangedAttack:
+#       SELECT proto FROM actions WHERE action = 'ChargedRangedAttack'
+#   which techs touch Hoplite armor:
+#       SELECT DISTINCT e.tech FROM effects e JOIN effect_targets t ON t.effect = e.id
+#       WHERE e.subtype = 'ArmorVulnerability' AND t.target IN (SELECT 'Hoplite' UNION SELECT unittype FROM proto_unittypes WHERE proto = 'Hoplite')
+# Action and tactics parameters are kept as generic tag/value rows, as there are far too many of them to give each a column.
+
+SCHEMA = """
+CREATE TABLE protos (name TEXT PRIMARY KEY, displayname TEXT, maxhitpoints REAL, los REAL, maxvelocity REAL, populationcount REAL, tactics TEXT, rollovertextid TEXT);
+CREATE TABLE proto_unittypes (proto TEXT, unittype TEXT);
+CREATE TABLE proto_flags (proto TEXT, flag TEXT);
+CREATE TABLE proto_armor (proto TEXT, type TEXT, value REAL);
+CREATE TABLE proto_costs (proto TEXT, resource TEXT, amount REAL);
+CREATE TABLE actions (proto TEXT, action TEXT);
+CREATE TABLE action_params (proto TEXT, action TEXT, tag TEXT, value TEXT, attrib TEXT);
+CREATE TABLE tactics (file TEXT, action TEXT, tag TEXT, value TEXT, attrib TEXT);
+CREATE TABLE techs (name TEXT PRIMARY KEY, displayname TEXT, researchtime REAL, rollovertextid TEXT);
+CREATE TABLE tech_prereqs (tech TEXT, prereq TEXT);
+CREATE TABLE tech_costs (tech TEXT, resource TEXT, amount REAL);
+CREATE TABLE effects (id INTEGER PRIMARY KEY, tech TEXT, type TEXT, subtype TEXT, relativity TEXT, amount REAL, action TEXT, attrib TEXT);
+CREATE TABLE effect_targets (effect INTEGER, type TEXT, target TEXT);
+CREATE TABLE godpowers (name TEXT PRIMARY KEY, displayname TEXT, cost REAL, repeatcost REAL, recharge REAL, rolloverid TEXT);
+CREATE TABLE strings (id TEXT PRIMARY KEY, value TEXT);
+
+CREATE INDEX proto_unittypes_proto ON proto_unittypes (proto);
+CREATE INDEX proto_unittypes_unittype ON proto_unittypes (unittype);
+CREATE INDEX proto_flags_proto ON proto_flags (proto);
+CREATE INDEX actions_proto ON actions (proto);
+CREATE INDEX actions_action ON actions (action);
+CREATE INDEX action_params_proto_action ON action_params (proto, action);
+CREATE INDEX tactics_file_action ON tactics (file, action);
+CREATE INDEX effects_tech ON effects (tech);
+CREATE INDEX effects_subtype ON effects (subtype);
+CREATE INDEX effect_targets_effect ON effect_targets (effect);
+CREATE INDEX effect_targets_target ON effect_targets (target);
+"""
+
+def _paramRows(node: ET.Element) -> Iterable[Tuple[str, str, str]]:
+    for child in node:
+        yield child.tag, child.text, json.dumps(dict(child.attrib)) if child.attrib else None
+
+def writeProtos(db: sqlite3.Connection):
+    for name, record in globals.protoRecords.items():
+        proto = record.element
+        db.execute("INSERT INTO protos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (name, common.getObjectDisplayName(proto), record.maxhitpoints, record.los, record.maxvelocity,
+                                                                     record.populationcount, common.findAndFetchText(proto, "tactics", None), common.findAndFetchText(proto, "rollovertextid", None)))
+        db.executemany("INSERT INTO proto_unittypes VALUES (?, ?)", [(name, unittype) for unittype in record.unittypes])
+        db.executemany("INSERT INTO proto_flags VALUES (?, ?)", [(name, flag) for flag in record.flags])
+        db.executemany("INSERT INTO proto_armor VALUES (?, ?, ?)", [(name, armorType, value) for armorType, value in record.armor.items()])
+        db.executemany("INSERT INTO proto_costs VALUES (?, ?, ?)", [(name, resource, amount) for resource, amount in record.cost.items()])
+        for action in record.actions:
+            actionName = common.findAndFetchText(action, "name", None)
+            db.execute("INSERT INTO actions VALUES (?, ?)", (name, actionName))
+            db.executemany("INSERT INTO action_params VALUES (?, ?, ?, ?, ?)", [(name, actionName, *row) for row in _paramRows(action)])
+
+def writeTactics(db: sqlite3.Connection):
+    for filename, root in globals.dataCollection["tactics"].items():
+        for action in root.findall("action"):
+            actionName = common.findAndFetchText(action, "name", None)
+            db.executemany("INSERT INTO tactics VALUES (?, ?, ?, ?, ?)", [(filename, actionName, *row) for row in _paramRows(action)])
+
+def writeTechs(db: sqlite3.Connection):
+    graph = globals.techGraph
+    for techName, tech in graph.techs.items():
+        db.execute("INSERT INTO techs VALUES (?, ?, ?, ?)", (techName, common.getObjectDisplayName(tech), graph.researchTime[techName], common.findAndFetchText(tech, "rollovertextid", None)))
+        db.executemany("INSERT INTO tech_prereqs VALUES (?, ?)", [(techName, prereq) for prereq in graph.prereqs[techName]])
+        db.executemany("INSERT INTO tech_costs VALUES (?, ?, ?)", [(techName, resource, amount) for resource, amount in graph.cost[techName].items()])
+    for row in globals.techEffectTable.rows:
+        cursor = db.execute("INSERT INTO effects (tech, type, subtype, relativity, amount, action, attrib) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (row.techName, row.type, row.subtype, row.relativity, row.amount, row.attrib.get("action", None), json.dumps(dict(row.attrib))))
+        db.executemany("INSERT INTO effect_targets VALUES (?, ?, ?)", [(cursor.lastrowid, target.attrib.get("type", None), target.text) for target in row.effect.findall("target")])
+
+def writeGodPowers(db: sqlite3.Connection):
+    for name, power in globals.abilityIndex.godPowerByName.items():
+        db.execute("INSERT INTO godpowers VALUES (?, ?, ?, ?, ?, ?)", (name, common.getObjectDisplayName(power), common.findAndFetchText(power, "cost", 0.0, float),
+                                                                      common.findAndFetchText(power, "repeatcost", 0.0, float), globals.godPowerRecharges.get(name, None), common.findAndFetchText(power, "rolloverid", None)))
+
+def writeStore(path: str):
+    if os.path.isfile(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(SCHEMA)
+        writeProtos(db)
+        writeTactics(db)
+        writeTechs(db)
+        writeGodPowers(db)
+        db.executemany("INSERT INTO strings VALUES (?, ?)", globals.stringMap.items())
+        db.commit()
+    finally:
+        db.close()
+    print(f"Wrote data store to {path}")
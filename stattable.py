@@ -0,0 +1,98 @@
+import globals
+import protorecord
+import array
+import math
+import xml.etree.ElementTree as ET
+import xmlbackend
+from typing import Dict, List, Union
+
+# Column oriented copy of the basic numeric unit stats, one row per proto, built from the proto records.
+# Missing values are NaN so that whole columns can be compared/exported without per-unit special casing.
+
+ARMOR_TYPES = ("Hack", "Pierce", "Crush")
+# Armor at or above this is treated as immune, matches what the unit tooltips have always done
+EHP_ARMOR_CAP = 0.99
+
+class ProtoStatTable:
+    def __init__(self, records: List[protorecord.ProtoUnitRecord]):
+        self.names: List[str] = [record.name for record in records]
+        self.rowByName: Dict[str, int] = {name:index for index, name in enumerate(self.names)}
+        self.resources: List[str] = sorted({resource for record in records for resource in record.cost.keys()})
+        self.columns: Dict[str, array.array] = {}
+        self.columns["maxhitpoints"] = array.array("d", [record.maxhitpoints for record in records])
+        self.columns["los"] = array.array("d", [math.nan if record.los is None else record.los for record in records])
+        self.columns["maxvelocity"] = array.array("d", [record.maxvelocity for record in records])
+        self.columns["populationcount"] = array.array("d", [record.populationcount for record in records])
+        self.columns["invulnerable"] = array.array("d", [1.0 if "Invulnerable" in record.flags else 0.0 for record in records])
+        for armorType in ARMOR_TYPES:
+            self.columns[f"armor{armorType}"] = array.array("d", [record.armor.get(armorType, math.nan) for record in records])
+        for resource in self.resources:
+            self.columns[f"cost{resource}"] = array.array("d", [record.cost.get(resource, 0.0) for record in records])
+        self.computeEffectiveHitpoints()
+
+    # Independent copy of the columns, sharing the (immutable) name index
+    def copy(self) -> "ProtoStatTable":
+        other = ProtoStatTable.__new__(ProtoStatTable)
+        other.names = self.names
+        other.rowByName = self.rowByName
+        other.resources = self.resources
+        other.columns = {name:array.array("d", values) for name, values in self.columns.items()}
+        return other
+
+    def computeEffectiveHitpoints(self):
+        hitpoints = self.columns["maxhitpoints"]
+        invulnerable = self.columns["invulnerable"]
+        for armorType in ARMOR_TYPES:
+            armor = self.columns[f"armor{armorType}"]
+            # NaN comparisons are false, so units without this armor type drop out here too
+            self.columns[f"ehp{armorType}"] = array.array("d", [hp/(1.0-arm) if hp > 0.0 and not invuln and arm < EHP_ARMOR_CAP else math.nan for hp, arm, invuln in zip(hitpoints, armor, invulnerable)])
+
+    def row(self, proto: Union[str, ET.Element]) -> Union[int, None]:
+        if isinstance(proto, xmlbackend.ELEMENT_TYPES):
+            record = protorecord.recordForProto(proto)
+            if record is None:
+                return None
+            proto = record.name
+        return self.rowByName.get(proto, None)
+
+    def get(self, proto: Union[str, ET.Element], column: str, default=None) -> Union[float, None]:
+        index = self.row(proto)
+        if index is None:
+            return default
+        value = self.columns[column][index]
+        if math.isnan(value):
+            return default
+        return value
+
+    def columnNames(self) -> List[str]:
+        return list(self.columns.keys())
+
+    # For bulk exports: one dict per proto, NaN values left out
+    def rows(self, columns: Union[List[str], None]=None):
+        if columns is None:
+            columns = self.columnNames()
+        selected = [self.columns[column] for column in columns]
+        for index, name in enumerate(self.names):
+            entry = {"name":name}
+            for column, values in zip(columns, selected):
+                if not math.isnan(values[index]):
+                    entry[column] = values[index]
+            yield entry
+
+# dmgType: effective hp, for the damage types the proto can actually be hurt by
+def effectiveHitpoints(proto: ET.Element) -> Dict[str, float]:
+    table = globals.protoStatTable
+    index = table.row(proto) if table is not None else None
+    if index is not None:
+        values = {armorType:table.columns[f"ehp{armorType}"][index] for armorType in ARMOR_TYPES}
+    else:
+        record = protorecord.ProtoUnitRecord(proto)
+        values = {}
+        if record.maxhitpoints > 0.0 and "Invulnerable" not in record.flags:
+            for armorType in ARMOR_TYPES:
+                armor = record.armor.get(armorType, math.nan)
+                values[armorType] = record.maxhitpoints/(1.0-armor) if armor < EHP_ARMOR_CAP else math.nan
+    return {armorType:value for armorType, value in values.items() if not math.isnan(value)}
+
+def buildProtoStatTable():
+    globals.protoStatTable = ProtoStatTable(list(globals.protoRecords.values()))
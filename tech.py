@@ -1,7 +1,7 @@
 import globals
 import common
 from xml.etree import ElementTree as ET
-from typing import List, Dict, Union, Callable, Any
+from typing import List, Dict, Union, Callable, Any, Iterable, Tuple
 import dataclasses
 import action
 import icon
@@ -9,6 +9,11 @@ import unitdescription
 import copy
 import godpower
 import re
+import functools
+import tooltipdoc
+import descriptioncache
+import diagnostics
+import multiprocessing
 
 VANILLA_FULL_TOOLTIP_EFFECT_COLOUR = lambda s: "<color=0.65,0.65,0.65>" + s + "</color>"
 
@@ -161,14 +166,41 @@ def getEffectTargets(tech: ET.Element, effect: ET.Element) -> List[str]:
             targets.append("Unknown")
     return targets
 
-def resolveActionModificationOnAbstractToTargetList(target: str, actionName: str, actionFilter: Callable[[ET.Element, ET.Element], bool] = lambda actionElem, tactics: True) -> List[ET.Element]:
+def _acceptAllActions(actionElem: ET.Element, tactics: ET.Element) -> bool:
+    return True
+
+@functools.cache
+def _protoNamesByLowerActionName() -> Dict[str, List[str]]:
+    # Candidates only, findActionByName still decides: it's case insensitive for protoactions but not for tactics actions
+    index = {}
+    for protoName, record in globals.protoRecords.items():
+        actionNames = {common.findAndFetchText(actionElem, "name", "").lower() for actionElem in record.actions}
+        tacticsFile = action.actionTactics(record.element, None)
+        if tacticsFile is not None:
+            actionNames.update(common.findAndFetchText(actionElem, "name", "").lower() for actionElem in tacticsFile.findall("action"))
+        for actionName in actionNames:
+            index.setdefault(actionName, []).append(protoName)
+    return index
+
+# (target, actionName, actionFilter): affected protos
+# Filters are part of the key by identity, so callers that want hits need to pass the same function object each time (see inactiveOnHitEffectFilter)
+_resolvedActionModifications: Dict[Tuple[str, str, Callable], List[ET.Element]] = {}
+
+def resolveActionModificationOnAbstractToTargetList(target: str, actionName: str, actionFilter: Callable[[ET.Element, ET.Element], bool] = _acceptAllActions) -> List[ET.Element]:
     "Return a list of protounits affected by trying to modify action of target, even if target is an abstract type"
+    key = (target, actionName, actionFilter)
+    cached = _resolvedActionModifications.get(key)
+    if cached is not None:
+        return list(cached)
     proto = common.protoFromName(target)
     protos = []
     if proto is None:
         # Is an abstract type
+        protosWithAction = set(_protoNamesByLowerActionName().get(actionName.lower(), []))
         possibleProtos = globals.protosByUnitType.get(target, [])
         for possibleProtoName in possibleProtos:
+            if possibleProtoName not in protosWithAction:
+                continue
             proto = common.protoFromName(possibleProtoName)
             actionElem = action.findActionByName(proto, actionName)
             if actionElem is not None:
@@ -181,7 +213,12 @@ def resolveActionModificationOnAbstractToTargetList(target: str, actionName: str
                     pass
     else:
         protos = [proto]
-    return protos
+    _resolvedActionModifications[key] = protos
+    return list(protos)
+
+@functools.cache
+def inactiveOnHitEffectFilter(effectName: str) -> Callable[[ET.Element, ET.Element], bool]:
+    return lambda actionElem, tactics: actionElem.find(f"onhiteffect[@type='{effectName}'][@active='0']")
 
 def relativityModifiedValue(effect: ET.Element, attrib: str):
     # 1.1 -> 10%
@@ -522,7 +559,7 @@ def dataSubtypeOnHitEffectActiveHandler(tech: ET.Element, effect:ET.Element):
     # Check effects to see if this effect is the first OnHitEffectiveActive in the list
     targetTypes = effect.findall("target[@type='ProtoUnit']")
     effectName = effect.attrib['effecttype']
-    actionFilter = lambda actionElem, tactics: actionElem.find(f"onhiteffect[@type='{effectName}'][@active='0']")
+    actionFilter = inactiveOnHitEffectFilter(effectName)
     responses = []
     for targetElement in targetTypes:
         target = targetElement.text
@@ -616,13 +653,13 @@ def dataSubtypeAssignOnHitEffectHandler(tech: ET.Element, effect:ET.Element):
 
 def dataSubtypePowerCostHandler(tech: ET.Element, effect:ET.Element):
     protoPower = effect.attrib['protopower']
-    powerData = globals.dataCollection['god_powers_combined'].find(f"power[@name='{protoPower}']")
+    powerData = globals.abilityIndex.godPower(protoPower)
     displayName = common.getObjectDisplayName(powerData)
     return dataSubtypeWithAmountHelper("Recast Cost of {combinable}: {value}", combinableString=displayName)(tech, effect)
 
 def dataSubtypePowerRofHandler(tech: ET.Element, effect:ET.Element):
     protoPower = effect.attrib['protopower']
-    powerData = globals.dataCollection['god_powers_combined'].find(f"power[@name='{protoPower}']")
+    powerData = globals.abilityIndex.godPower(protoPower)
     displayName = common.getObjectDisplayName(powerData)
     return dataSubtypeWithAmountHelper("Recharge Time of {combinable}: {value}", combinableString=displayName)(tech, effect)
 
@@ -1099,7 +1136,46 @@ def handlerResponseListToStrings(input: Union[EffectHandlerResponse, List[Effect
     strings = [response.toString(skipAffectedObjects=skipAffectedObjects) for response in input]
     return strings
 
+# (tech name, formatting args): (output, ((registry, key, version of that entry it was generated with), ...))
+_processTechCache: Dict[Tuple, Tuple[Union[str, None], Tuple]] = {}
+
+# Effect text can depend on overrides that get registered (or replaced) as generation goes on (eg unit action names for ability techs).
+# The memo above checks just the entries a tech read. The persistent cache can only be keyed before generating, so it gets each registry's whole write count
+def _overrideRegistryState() -> Tuple[int, int, int]:
+    return techManualAdditions.version, unitdescription.unitDescriptionOverrides.version, godpower.godPowerProcessingParams.version
+
+def _dependenciesAreCurrent(dependencies: Tuple) -> bool:
+    return all(registry.keyVersion(key) == version for registry, key, version in dependencies)
+
 def processTech(tech: ET.Element, skipAffectedObjects: bool=False, lineJoin: str=f"\\n", bulletLateLines=False):
+    additions = techManualAdditions.get(tech.attrib['name'], None)
+    key = (tech.attrib['name'], skipAffectedObjects, lineJoin, bulletLateLines)
+    entry = _processTechCache.get(key)
+    # Checking reads the same entries again, so any processTech (or other cache) this is nested inside picks them up as its own dependencies too
+    if entry is not None and _dependenciesAreCurrent(entry[1]):
+        output = entry[0]
+    else:
+        reads = []
+        generated = []
+        def generate():
+            generated.append(True)
+            return _processTechText(tech, skipAffectedObjects, lineJoin, bulletLateLines)
+        common.registryReadRecorders.append(reads)
+        try:
+            output = descriptioncache.cached("tech", tech, (skipAffectedObjects, lineJoin, bulletLateLines, additions, _overrideRegistryState()), generate)
+        finally:
+            common.registryReadRecorders.pop()
+        if not generated:
+            # Served from disk, so which entries it read isn't known: any write to the registries counts
+            reads = [(registry, common.VersionedRegistry.ALL_KEYS) for registry in (techManualAdditions, unitdescription.unitDescriptionOverrides, godpower.godPowerProcessingParams)]
+        dependencies = {(id(registry), readKey):(registry, readKey) for registry, readKey in reads}.values()
+        _processTechCache[key] = (output, tuple((registry, readKey, registry.keyVersion(readKey)) for registry, readKey in dependencies))
+    # Done on every call, cached or not, as it always has been
+    if output is not None and additions is not None and len(additions.historyText) > 0:
+        common.prependTextToHistoryFile(tech.attrib['name'], "techs", additions.historyText)
+    return output
+
+def _processTechText(tech: ET.Element, skipAffectedObjects: bool, lineJoin: str, bulletLateLines: bool) -> Union[str, None]:
     #print(f"Processing tech: {tech.attrib['name']}")
     # Minor god techs show up over the portraits. That makes me very sad, but I don't want to get into changing UI files as well really
     # so let's just leave these strings as vanilla
@@ -1145,42 +1221,41 @@ def processTech(tech: ET.Element, skipAffectedObjects: bool=False, lineJoin: str
     if not bulletLateLines:
         output = lineJoin.join(strings)
     else:
-        output = ""
+        document = tooltipdoc.TooltipDocument()
         for index, string in enumerate(strings):
+            # These are already tooltip text
             if index != 0:
-                output += f"{icon.BULLET_POINT} "
-            output += string
-            if index != len(strings)-1:
-                output += lineJoin
-        output = output.strip()
+                document.line().bullet(tooltipdoc.Markup(string))
+            else:
+                document.markup(string)
+        output = document.render(lineBreak=lineJoin).strip()
     if len(output) == 0: # Need to output something or we get <MISSING> if empty
         if len(effects):
             common.warn(f"tech {tech.attrib['name']} with {len(effects)} effects had no text output, reverting to vanilla text")
         return None
-    
-    if additions is not None and len(additions.historyText) > 0:
-        common.prependTextToHistoryFile(tech.attrib['name'], "techs", additions.historyText)
 
     return output
 
-techManualAdditions: Dict[str, TechAddition] = {}
+techManualAdditions: Dict[str, TechAddition] = common.VersionedRegistry()
 
 
 
-def generateTechDescriptions():
-    proto = globals.dataCollection["proto.xml"]
-    techtree = globals.dataCollection["techtree.xml"]
-
-    for techElement in techtree:
-        if techElement.find("[flag='Volatile']") is not None:
-            create = techElement.find("effects/effect[@type='CreateUnit']")
-            if create is not None:
-                globals.respawnTechs[create.attrib['unit']] = techElement
+def findRespawnTechs():
+    # Only the first CreateUnit of each volatile tech counts
+    respawnCheckedTechs = set()
+    for row in globals.techEffectTable.select(type="CreateUnit"):
+        if row.techName in respawnCheckedTechs or not globals.techEffectTable.techHasFlag(row.techName, "Volatile"):
+            continue
+        respawnCheckedTechs.add(row.techName)
+        globals.respawnTechs[row.attrib['unit']] = row.tech
 
     # These associations come from aotg data but will show in tooltips if not dealt with
     del globals.respawnTechs["Promethean"]
     del globals.respawnTechs["MountainGiant"]
 
+def setupTechOverrides():
+    techtree = globals.dataCollection["techtree.xml"]
+
     # Techs are done before units.
     # This means those in the unit describer aren't loaded when this runs, so any that really NEED changing need to go here...
     # And simply changing the order isn't really doable because some of the stuff in the unit describer is dependent on the tech overrides - there's no good way to do this
@@ -1347,7 +1422,7 @@ def generateTechDescriptions():
 
     newfire = common.techFromName("GreatTempleNewFireCeremony")
     newfireDevotion = newfire.find("devotioncost")
-    newfirepower = globals.dataCollection["abilities_combined"].find("power[@name='GreatTempleNewFireCeremony']")
+    newfirepower = globals.abilityIndex.power("GreatTempleNewFireCeremony")
     techManualAdditions["GreatTempleNewFireCeremony"] = TechAddition(endEntry=f"Garrison {newfireDevotion.text}x {newfireDevotion.attrib['devotiontype']} into the Great Temple and activate. {godpower.processGodPower(newfirepower)}")
 
     techManualAdditions["GreatTempleCosmicGuard"] = TechAddition(endEntry=globals.dataCollection['string_table.txt']['STR_TECH_COSMIC_GUARD_LR'] + " May only be used once per game.")
@@ -1406,16 +1481,70 @@ def generateTechDescriptions():
     # "Spawns 1 Boar (Arkantos and Ajax)"" is fuzzymerged nonsense
     techManualAdditions["AOTGHeroBoarStartDivine"] = TechAddition(fuzzyMerge=False)
 
-
+# Worker processes to spread generateTechDescriptions over, 0 = do it all here (set by main --jobs)
+parallelWorkers = 0
+
+def _processTechForDescription(tech: ET.Element) -> Union[str, None]:
+    try:
+        return processTech(tech)
+    except Exception as e:
+        raise ValueError(f"Error generating description for {tech.attrib['name']}")
+
+def _initTechWorker(cacheDir: Union[str, None]):
+    # Spawned workers start with nothing loaded, so they need to get to the point the parent was at when it started them
+    import main
+    main.prepareData()
+    if cacheDir is not None:
+        descriptioncache.enable(cacheDir)
+    findRespawnTechs()
+    setupTechOverrides()
+    # Any warnings from this were already given by the parent
+    diagnostics.collector.clear()
+
+def _processTechChunk(indexes: List[int]) -> Tuple[List[Tuple[Union[str, None], list]], List[diagnostics.Diagnostic]]:
+    techs = list(globals.dataCollection["techtree.xml"])
+    countsBefore = diagnostics.collector.counts()
+    results = []
+    for index in indexes:
+        recorder = []
+        common.sideEffectRecorders.append(recorder)
+        try:
+            value = _processTechForDescription(techs[index])
+        finally:
+            common.sideEffectRecorders.pop()
+        results.append((value, recorder))
+    return results, diagnostics.collector.entriesSince(countsBefore)
+
+def _processTechsInParallel(techs: List[ET.Element]) -> List[Union[str, None]]:
+    # Workers hand back each tech's text along with the ability strings/history text it added and any warnings it gave, which get applied here in techtree order.
+    # So the output is the same as doing it serially
+    indexes = [index for index, tech in enumerate(techs) if common.findAndFetchText(tech, "rollovertextid", None) is not None]
+    chunkSize = max(1, len(indexes)//(parallelWorkers*8))
+    chunks = [indexes[start:start+chunkSize] for start in range(0, len(indexes), chunkSize)]
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Forked workers already have everything the parent had set up
+        pool = multiprocessing.get_context("fork").Pool(parallelWorkers)
+    else:
+        pool = multiprocessing.get_context("spawn").Pool(parallelWorkers, initializer=_initTechWorker, initargs=(descriptioncache.cacheDir,))
+    values: List[Union[str, None]] = [None] * len(techs)
+    with pool:
+        for indexChunk, (results, warnings) in zip(chunks, pool.imap(_processTechChunk, chunks)):
+            for index, (value, sideEffects) in zip(indexChunk, results):
+                descriptioncache.replaySideEffects(sideEffects)
+                values[index] = value
+            diagnostics.collector.merge(warnings)
+    return values
+
+# strid: {tech: description} for the given techs, ready for handleSharedStringIDConflicts
+def techDescriptionsByStringId(techs: Iterable[ET.Element], parallel: bool=False) -> Dict[str, Dict[ET.Element, str]]:
     stringIdsByOverwriters = {}
+    techs = list(techs)
+    parallelValues = _processTechsInParallel(techs) if parallel else None
 
-    for tech in techtree:
+    for index, tech in enumerate(techs):
         strid = common.findAndFetchText(tech, "rollovertextid", None)
         if strid is not None:
-            try:
-                value = processTech(tech)
-            except Exception as e:
-                raise ValueError(f"Error generating description for {tech.attrib['name']}")
+            value = parallelValues[index] if parallelValues is not None else _processTechForDescription(tech)
             if value is not None:
                 if int(globals.config["options"].get("retainVanillaTooltipForUnitsAndTechs", 0)):
                     value = globals.dataCollection["string_table.txt"][strid] + "\n" + value
@@ -1423,7 +1552,14 @@ def generateTechDescriptions():
                     stringIdsByOverwriters[strid] = {}
                 if value not in stringIdsByOverwriters[strid].values():
                     stringIdsByOverwriters[strid][tech] = value
+    return stringIdsByOverwriters
+
+def generateTechDescriptions():
+    techtree = globals.dataCollection["techtree.xml"]
+    findRespawnTechs()
+    setupTechOverrides()
 
+    stringIdsByOverwriters = techDescriptionsByStringId(techtree, parallel=parallelWorkers > 0)
     common.handleSharedStringIDConflicts(stringIdsByOverwriters)
 
     ageIndexes = {"ClassicalAge":1, "HeroicAge":2, "MythicAge":3}
@@ -1476,7 +1612,7 @@ def generateTechDescriptions():
             #unitsCreatedString = common.commaSeparatedList(common.unwrapAbstractClass(unitsCreated))
             unitsCreatedString = " ".join([icon.generalIcon(common.protoFromName(unit).find('icon').text) for unit in unitsCreated])
             powerGranted = tech.find("effects/effect[@subtype='GodPower']").attrib['power']
-            powerElement = globals.dataCollection['god_powers_combined'].find(f"power[@name='{powerGranted}']")
+            powerElement = globals.abilityIndex.godPower(powerGranted)
             powerGrantedName = icon.generalIcon(powerElement.find('icon').text)
             #powerGrantedName = common.getObjectDisplayName(powerElement)
             techDisplayName = common.getObjectDisplayName(tech)
@@ -0,0 +1,177 @@
+import globals
+import stattable
+import array
+import math
+from common import findAndFetchText
+from typing import Dict, Iterable, List, Tuple, Union
+
+# Applies the numeric Data effects of techs to a copy of the base stat table, so stats can be worked out for a given set of techs (eg per age or civ).
+# Only the subtypes that map to a stat table column are handled. Effects that modify actions (have an action attribute) are left out, as are non-Data effects.
+# Each effect is one update of its column over all the rows it targets: vectorised if numpy is installed, a single comprehension over those rows otherwise.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Lowercase data subtype: stat table column
+SUBTYPE_COLUMNS = {
+    "hitpoints":"maxhitpoints",
+    "los":"los",
+    "maximumvelocity":"maxvelocity",
+    "populationcount":"populationcount",
+}
+
+AGES = ("ArchaicAge", "ClassicalAge", "HeroicAge", "MythicAge")
+
+def _elementwise(function):
+    # Lists (without numpy) go through one value at a time, numpy arrays through the same expression all at once
+    def apply(current, base, amount):
+        if numpy is not None:
+            return function(current, base, amount)
+        return [function(value, baseValue, amount) for value, baseValue in zip(current, base)]
+    return apply
+
+def _assign(current, base, amount):
+    if numpy is not None:
+        return numpy.where(numpy.isnan(current), current, amount)
+    return [value if math.isnan(value) else amount for value in current]
+
+# Lowercase relativity: (current values, base values, amount) -> new values
+RELATIVITIES = {
+    "absolute":_elementwise(lambda value, base, amount: value + amount),
+    "percent":_elementwise(lambda value, base, amount: value * amount),
+    "basepercent":_elementwise(lambda value, base, amount: value + base * (amount - 1.0)),
+    # Replaces the base value, keeping anything else that's been applied on top
+    "override":_elementwise(lambda value, base, amount: value + amount - base),
+    "assign":_assign,
+}
+
+# The stat table column an effect changes, or None if it isn't one that's handled
+def statColumnForEffect(attrib: Dict[str, str]) -> Union[str, None]:
+    subtype = attrib.get("subtype", "").lower()
+    if subtype in SUBTYPE_COLUMNS:
+        return SUBTYPE_COLUMNS[subtype]
+    if subtype == "cost":
+        return f"cost{attrib.get('resource', '')}"
+    if subtype == "armorvulnerability":
+        for armorType in stattable.ARMOR_TYPES:
+            if armorType.lower() == attrib.get("armortype", "").lower():
+                return f"armor{armorType}"
+    return None
+
+class TechApplication:
+    def __init__(self, base: Union[stattable.ProtoStatTable, None]=None):
+        self.base = base if base is not None else globals.protoStatTable
+        self.table = self.base.copy()
+        self.appliedTechs: List[str] = []
+        self._rowsByTargets: Dict[Tuple[str, ...], List[int]] = {}
+
+    # Table rows of every proto hit by any of targets (proto names or unit types), sorted
+    def rowsForTargets(self, targets: Iterable[str]) -> List[int]:
+        targets = tuple(targets)
+        rows = self._rowsByTargets.get(targets)
+        if rows is None:
+            names = set(targets)
+            for target in targets:
+                names.update(globals.protosByUnitType.get(target, []))
+            rows = sorted(self.table.rowByName[name] for name in names if name in self.table.rowByName)
+            if numpy is not None:
+                rows = numpy.array(rows, dtype=numpy.intp)
+            self._rowsByTargets[targets] = rows
+        return rows
+
+    def columnForEffect(self, attrib: Dict[str, str]) -> Union[str, None]:
+        column = statColumnForEffect(attrib)
+        if column is not None and column not in self.table.columns:
+            # Cost columns only exist for resources something in the base data costs
+            self.table.columns[column] = array.array("d", [0.0] * len(self.table.names))
+        return column
+
+    def applyEffect(self, attrib: Dict[str, str], targets: Iterable[str]):
+        column = self.columnForEffect(attrib)
+        if column is None or "action" in attrib or "amount" not in attrib:
+            return
+        amount = float(attrib["amount"])
+        relativity = attrib.get("relativity", "absolute").lower()
+        rows = self.rowsForTargets(targets)
+        if len(rows) == 0:
+            return
+        values = self.table.columns[column]
+        baseValues = self.base.columns.get(column)
+        if numpy is not None:
+            # Views onto the array.array columns, so this writes straight into the table
+            values = numpy.frombuffer(values)
+            current = values[rows]
+            base = numpy.frombuffer(baseValues)[rows] if baseValues is not None else numpy.zeros(len(rows))
+        else:
+            current = [values[row] for row in rows]
+            base = [baseValues[row] for row in rows] if baseValues is not None else [0.0] * len(rows)
+        if column.startswith("armor"):
+            # Vulnerability is 1-armor, and these are always additive changes to it (see tech.relativityModifierArmor).
+            # Units without the armor type start from 0
+            if numpy is not None:
+                updated = numpy.nan_to_num(current, nan=0.0) - amount
+            else:
+                updated = [(0.0 if math.isnan(value) else value) - amount for value in current]
+        else:
+            if relativity not in RELATIVITIES:
+                raise ValueError(f"Unknown relativity {relativity}")
+            # NaN (eg LOS on something that doesn't have it) means there's nothing to modify: NaN stays NaN through all of these
+            updated = RELATIVITIES[relativity](current, base, amount)
+        if numpy is not None:
+            values[rows] = updated
+        else:
+            for row, value in zip(rows, updated):
+                values[row] = value
+
+    def applyTech(self, techName: str):
+        for row in globals.techEffectTable.select(tech=techName, type="Data"):
+            targets = [node.text for node in row.effect.findall("target") if node.attrib.get("type", "").lower() == "protounit"]
+            if targets:
+                self.applyEffect(row.attrib, targets)
+        self.appliedTechs.append(techName)
+
+    def applyTechs(self, techNames: Iterable[str]) -> stattable.ProtoStatTable:
+        for techName in techNames:
+            self.applyTech(techName)
+        self.table.computeEffectiveHitpoints()
+        return self.table
+
+# Techs with a Data effect that would change one of this proto's stat table columns, in techtree order (eg for "what upgrades this unit's hitpoints or armor")
+def statUpgradesForProto(protoName: str) -> List[str]:
+    techNames = []
+    for row in globals.techEffectTable.effectsOnProto(protoName):
+        if row.type == "Data" and "action" not in row.attrib and row.amount is not None and statColumnForEffect(row.attrib) is not None:
+            techNames.append(row.techName)
+    return list(dict.fromkeys(techNames))
+
+def statsWithTechs(techNames: Iterable[str]) -> stattable.ProtoStatTable:
+    return TechApplication().applyTechs(techNames)
+
+# The age techs a civ gets on reaching this age: the generic one, its culture's and its major god's, eg ClassicalAgeGeneral, ClassicalAgeGreek.
+# The archaic ones are the starting bonuses, eg ArchaicAgeChinese, ArchaicAgeThor
+def ageUpTechs(age: str, culture: Union[str, None], civ: Union[str, None]=None) -> List[str]:
+    candidates = [f"{age}General"] + [f"{age}{name}" for name in (culture, civ) if name is not None]
+    return [techName for techName in candidates if techName in globals.techEffectTable.byTech]
+
+# major god name: culture name, from major_gods.xml
+def civCultures() -> Dict[str, Union[str, None]]:
+    return {findAndFetchText(civ, "name", None):findAndFetchText(civ, "culture", None) for civ in globals.dataCollection["major_gods.xml"].findall("civ")}
+
+# age: stat table with all age techs up to and including that age applied. Minor god choices are left to the caller (extraTechsByAge)
+def statsPerAge(culture: Union[str, None], extraTechsByAge: Union[Dict[str, List[str]], None]=None, civ: Union[str, None]=None) -> Dict[str, stattable.ProtoStatTable]:
+    if extraTechsByAge is None:
+        extraTechsByAge = {}
+    engine = TechApplication()
+    results = {}
+    for age in AGES:
+        techs = ageUpTechs(age, culture, civ) + extraTechsByAge.get(age, [])
+        results[age] = engine.applyTechs(techs).copy()
+    return results
+
+# civ: age: stat table, for every major god
+def statsPerCiv(extraTechsByCivAndAge: Union[Dict[str, Dict[str, List[str]]], None]=None) -> Dict[str, Dict[str, stattable.ProtoStatTable]]:
+    if extraTechsByCivAndAge is None:
+        extraTechsByCivAndAge = {}
+    return {civ:statsPerAge(culture, extraTechsByCivAndAge.get(civ, None), civ) for civ, culture in civCultures().items()}
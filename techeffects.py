@@ -0,0 +1,103 @@
+import globals
+import dataclasses
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple, Union
+
+# Every effects/effect of every tech flattened once into rows, with indexes on the things scans usually filter by.
+# Built after clarifyImplicitTechAbilities, which adds effects to techs.
+
+@dataclasses.dataclass
+class TechEffectRow:
+    tech: ET.Element
+    techName: str
+    effect: ET.Element
+    type: str
+    subtype: Union[str, None]
+    relativity: Union[str, None]
+    amount: Union[float, None]
+    # Text of the target nodes, in order
+    targets: Tuple[str, ...]
+    # The effect node's own attrib dict, not a copy
+    attrib: Dict[str, str]
+
+class TechEffectTable:
+    def __init__(self, techtree: ET.Element):
+        self.rows: List[TechEffectRow] = []
+        self.byType: Dict[str, List[int]] = {}
+        self.bySubtype: Dict[str, List[int]] = {}
+        self.byTarget: Dict[str, List[int]] = {}
+        self.byTech: Dict[str, List[int]] = {}
+        self.techFlags: Dict[str, frozenset[str]] = {}
+        self._rowsByProto: Union[Dict[str, List[TechEffectRow]], None] = None
+        for techElement in techtree:
+            techName = techElement.attrib["name"]
+            self.techFlags[techName] = frozenset(flag.text for flag in techElement.findall("flag"))
+            self.byTech[techName] = []
+            for effect in techElement.findall("effects/effect"):
+                amount = effect.attrib.get("amount", None)
+                row = TechEffectRow(techElement, techName, effect, effect.attrib.get("type", ""), effect.attrib.get("subtype", None), effect.attrib.get("relativity", None),
+                                    None if amount is None else float(amount), tuple(target.text for target in effect.findall("target")), effect.attrib)
+                index = len(self.rows)
+                self.rows.append(row)
+                self.byType.setdefault(row.type, []).append(index)
+                if row.subtype is not None:
+                    self.bySubtype.setdefault(row.subtype, []).append(index)
+                for target in set(row.targets):
+                    self.byTarget.setdefault(target, []).append(index)
+                self.byTech[techName].append(index)
+
+    # Rows matching everything given, in techtree order. Extra keyword arguments are matched against the effect's attributes
+    def select(self, type: Union[str, None]=None, subtype: Union[str, None]=None, tech: Union[str, None]=None, target: Union[str, None]=None, **attribs: str) -> List[TechEffectRow]:
+        candidates = None
+        for index, key in ((self.byTech, tech), (self.bySubtype, subtype), (self.byType, type), (self.byTarget, target)):
+            if key is None:
+                continue
+            matches = index.get(key, [])
+            if candidates is None or len(matches) < len(candidates):
+                candidates = matches
+        if candidates is None:
+            candidates = range(len(self.rows))
+        results = []
+        for rowIndex in candidates:
+            row = self.rows[rowIndex]
+            if type is not None and row.type != type:
+                continue
+            if subtype is not None and row.subtype != subtype:
+                continue
+            if tech is not None and row.techName != tech:
+                continue
+            if target is not None and target not in row.targets:
+                continue
+            if any(row.attrib.get(attrib, None) != value for attrib, value in attribs.items()):
+                continue
+            results.append(row)
+        return results
+
+    def techHasFlag(self, techName: str, flag: str) -> bool:
+        return flag in self.techFlags.get(techName, ())
+
+    # protoName: rows of effects that target it, directly or through one of its unit types. Built on first use
+    def rowsByProto(self) -> Dict[str, List[TechEffectRow]]:
+        if self._rowsByProto is None:
+            self._rowsByProto = {}
+            for row in self.rows:
+                affected = set()
+                for target in row.effect.findall("target"):
+                    if target.attrib.get("type", "").lower() != "protounit":
+                        continue
+                    if target.text in globals.protoRecords:
+                        affected.add(target.text)
+                    affected.update(name for name in globals.protosByUnitType.get(target.text, []) if name in globals.protoRecords)
+                # Sorted so the output doesn't depend on set ordering
+                for protoName in sorted(affected):
+                    self._rowsByProto.setdefault(protoName, []).append(row)
+        return self._rowsByProto
+
+    def effectsOnProto(self, protoName: str) -> List[TechEffectRow]:
+        return self.rowsByProto().get(protoName, [])
+
+    def techsAffectingProto(self, protoName: str) -> List[str]:
+        return list(dict.fromkeys(row.techName for row in self.effectsOnProto(protoName)))
+
+def buildTechEffectTable():
+    globals.techEffectTable = TechEffectTable(globals.dataCollection["techtree.xml"])
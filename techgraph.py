@@ -0,0 +1,87 @@
+import globals
+import common
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Union
+
+# Prerequisite/enabler graph over techtree.xml.
+# A tech depends on every tech in its prereqs/techstatus, and on its enabler (the tech with a TechStatus obtainable effect for it) if it has exactly one.
+# Techs with several enablers only need any one of them, so there's no single chain to add up and they're left out of the cumulative totals.
+
+class TechGraph:
+    def __init__(self, techtree: ET.Element):
+        self.techs: Dict[str, ET.Element] = {tech.attrib["name"]:tech for tech in techtree}
+        self.prereqs: Dict[str, List[str]] = {}
+        # enabled tech: enabling techs, in techtree order. A tech that enables the same thing twice is listed twice, so it also counts as "multiple enablers"
+        self.enablers: Dict[str, List[str]] = {}
+        self.cost: Dict[str, Dict[str, float]] = {}
+        self.researchTime: Dict[str, float] = {}
+        for techName, tech in self.techs.items():
+            self.prereqs[techName] = [elem.text for elem in tech.findall("prereqs/techstatus") if elem.text in self.techs]
+            costs = {}
+            for costElem in tech.findall("cost"):
+                costs[costElem.attrib["resourcetype"]] = costs.get(costElem.attrib["resourcetype"], 0.0) + float(costElem.text)
+            self.cost[techName] = costs
+            self.researchTime[techName] = common.findAndFetchText(tech, "researchpoints", 0.0, float)
+        for row in globals.techEffectTable.select(type="TechStatus", status="obtainable"):
+            self.enablers.setdefault(row.effect.text, []).append(row.techName)
+
+        self.parents: Dict[str, List[str]] = {}
+        for techName in self.techs.keys():
+            parents = list(self.prereqs[techName])
+            enablers = self.enablers.get(techName, [])
+            if len(enablers) == 1 and enablers[0] not in parents:
+                parents.append(enablers[0])
+            self.parents[techName] = [parent for parent in parents if parent != techName]
+        self.order = self._topologicalOrder()
+        self._ancestors: Union[Dict[str, frozenset[str]], None] = None
+
+    def _topologicalOrder(self) -> List[str]:
+        children: Dict[str, List[str]] = {techName:[] for techName in self.techs.keys()}
+        remainingParents = {}
+        for techName, parents in self.parents.items():
+            remainingParents[techName] = len(parents)
+            for parent in parents:
+                children[parent].append(techName)
+        # Kahn's algorithm, seeded in techtree order so the result is stable
+        order = [techName for techName, count in remainingParents.items() if count == 0]
+        index = 0
+        while index < len(order):
+            for child in children[order[index]]:
+                remainingParents[child] -= 1
+                if remainingParents[child] == 0:
+                    order.append(child)
+            index += 1
+        if len(order) != len(self.techs):
+            cyclic = [techName for techName, count in remainingParents.items() if count > 0]
+            common.warn_data(f"Tech prerequisite cycle involving {', '.join(cyclic)}")
+            order += cyclic
+        return order
+
+    def multipleEnablers(self, techName: str) -> bool:
+        return len(self.enablers.get(techName, [])) > 1
+
+    # techName: every tech that has to be researched before it. One pass in topological order, each tech reusing its parents' sets
+    def ancestors(self) -> Dict[str, frozenset[str]]:
+        if self._ancestors is None:
+            self._ancestors = {}
+            for techName in self.order:
+                result = set()
+                for parent in self.parents[techName]:
+                    result.add(parent)
+                    result.update(self._ancestors.get(parent, ()))
+                self._ancestors[techName] = frozenset(result)
+        return self._ancestors
+
+    # Shared ancestors are only counted once, so this is a union of the chain rather than a sum along every path
+    def cumulativeCost(self, techName: str) -> Dict[str, float]:
+        total = dict(self.cost[techName])
+        for ancestor in self.ancestors()[techName]:
+            for resource, amount in self.cost[ancestor].items():
+                total[resource] = total.get(resource, 0.0) + amount
+        return total
+
+    def cumulativeResearchTime(self, techName: str) -> float:
+        return self.researchTime[techName] + sum(self.researchTime[ancestor] for ancestor in self.ancestors()[techName])
+
+def buildTechGraph():
+    globals.techGraph = TechGraph(globals.dataCollection["techtree.xml"])
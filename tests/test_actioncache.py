@@ -0,0 +1,50 @@
+import xml.etree.ElementTree as ET
+import globals
+import action
+import common
+import diagnostics
+import godpower
+import unitdescription
+
+@action.cachedByProtoAndAction
+def warningHelper(proto, actionName):
+    common.warn(f"{proto}'s {actionName} looks wrong")
+    return len(actionName)
+
+@action.cachedByProtoAndAction
+def outerHelper(proto, actionName):
+    return warningHelper(proto, actionName) + 1
+
+def test_cached_helpers_count_their_warnings_on_every_call(monkeypatch):
+    monkeypatch.setattr(diagnostics, "collector", diagnostics.DiagnosticsCollector())
+    for _ in range(3):
+        assert warningHelper("Hoplite", "HandAttack") == 10
+    assert outerHelper("Hoplite", "HandAttack") == 11
+    assert outerHelper("Hoplite", "HandAttack") == 11
+    assert [entry.count for entry in diagnostics.collector.entries.values()] == [5]
+
+PROTO_XML = """<protos>
+<unit name="Hoplite"><protoaction><name>DevoteMinor</name><devotionpower>Bolt</devotionpower></protoaction><protoaction><name>HandAttack</name></protoaction></unit>
+</protos>"""
+
+def test_describe_action_only_depends_on_the_described_powers_params(monkeypatch):
+    monkeypatch.setattr(globals, "dataCollection", {"proto.xml":ET.fromstring(PROTO_XML)})
+    monkeypatch.setattr(godpower, "godPowerProcessingParams", common.VersionedRegistry())
+    monkeypatch.setattr(unitdescription, "unitDescriptionOverrides", common.VersionedRegistry())
+    action.clearActionResultCaches()
+    calls = []
+    monkeypatch.setattr(action, "_describeActionUncached", lambda proto, actionName, *args: calls.append(actionName) or f"{proto} {actionName} {len(calls)}")
+
+    first = action.describeAction("Hoplite", "DevoteMinor")
+    attack = action.describeAction("Hoplite", "HandAttack")
+    # Other powers' params being registered (eg by setupGodPowerOverrides between the unit and major god generators) changes nothing here
+    godpower.godPowerProcessingParams["Lure"] = godpower.GodPowerParams("Lure")
+    assert action.describeAction("Hoplite", "DevoteMinor") == first
+    assert action.describeAction("Hoplite", "HandAttack") == attack
+    assert calls == ["DevoteMinor", "HandAttack"]
+
+    godpower.godPowerProcessingParams["Bolt"] = godpower.GodPowerParams("Bolt")
+    assert action.describeAction("Hoplite", "DevoteMinor") != first
+    assert action.describeAction("Hoplite", "HandAttack") == attack
+    assert calls == ["DevoteMinor", "HandAttack", "DevoteMinor"]
+    action.clearActionResultCaches()
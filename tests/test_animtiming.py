@@ -0,0 +1,40 @@
+import xml.etree.ElementTree as ET
+import globals
+import action
+import animtiming
+
+SIMDATA = """<simdata>
+<animxml file="units/hoplite_anim.xml"><animations>
+<animinfo><name>HandAttack</name><versions>
+<version><duration>1.5</duration><tags>
+<tag><type>SoundEvent</type><position>0.1</position></tag>
+<tag><type>Attack</type><position>0.4</position></tag>
+<tag><type>FootstepLeft</type><position>0.5</position></tag>
+<tag><type>Attack</type><position>0.8</position></tag>
+<tag><type>FootstepRight</type><position>0.9</position></tag>
+</tags></version>
+<version><duration>1.5</duration><tags>
+<tag><type>Attack</type><position>0.3</position></tag>
+<tag><type>SoundEvent</type><position>0.3</position></tag>
+<tag><type>Attack</type></tag>
+</tags></version>
+</versions></animinfo>
+</animations></animxml>
+</simdata>"""
+
+PROTO_XML = """<protos>
+<unit name="Hoplite"><animfile>units/hoplite_anim.xml</animfile><protoaction><name>HandAttack</name></protoaction></unit>
+</protos>"""
+
+def test_attack_count_ignores_other_tag_types(tmp_path, monkeypatch):
+    path = tmp_path / "simdata.xml"
+    path.write_text(SIMDATA, encoding="utf8")
+    monkeypatch.setattr(globals, "animAttackIndex", animtiming.loadAnimAttackIndex(str(path)))
+    monkeypatch.setattr(globals, "dataCollection", {"proto.xml":ET.fromstring(PROTO_XML)})
+    action.clearActionResultCaches()
+
+    versions = animtiming.animFileSections("units/hoplite_anim.xml")[0]["HandAttack"][0]
+    assert [version.attackTagCount for version in versions] == [2, 2]
+    assert [version.attackPositions for version in versions] == [(0.4, 0.8), (0.3,)]
+    assert action.getActionAttackCount("Hoplite", "HandAttack") == 2
+    action.clearActionResultCaches()
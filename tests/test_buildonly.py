@@ -0,0 +1,103 @@
+import xml.etree.ElementTree as ET
+import configparser
+import os
+import globals
+import main
+import tech
+import common
+import diagnostics
+import unitdescription
+
+PROTO_XML = """<protos>
+<unit name="Hoplite"><rollovertextid>STR_UNIT_HOPLITE_LR</rollovertextid></unit>
+<unit name="Toxotes"><rollovertextid>STR_UNIT_TOXOTES_LR</rollovertextid></unit>
+<unit name="AnimalOfSet"><rollovertextid>STR_UNIT_ANIMAL_OF_SET_LR</rollovertextid></unit>
+</protos>"""
+
+TECHTREE_XML = """<techtree>
+<tech name="ArchaicAgeZeus"><rollovertextid>STR_TECH_ZEUS_LR</rollovertextid></tech>
+<tech name="Bronze"><rollovertextid>STR_TECH_BRONZE_LR</rollovertextid></tech>
+</techtree>"""
+
+def fakeTechDescriptions(techs):
+    # Tech text reads the unit overrides, like the ability techs' action names do
+    suffix = " (after unit setup)" if "Hoplite" in unitdescription.unitDescriptionOverrides else ""
+    return {tech.find("rollovertextid").text:{tech:f"Description of {tech.attrib['name']}{suffix}"} for tech in techs}
+
+def fakeSetupUnitOverrides():
+    unitdescription.unitDescriptionOverrides["Hoplite"] = unitdescription.UnitDescription()
+
+def fakeUnitDescriptions(protos):
+    stringIdsByOverwriters = {}
+    for proto in protos:
+        stringIdsByOverwriters.setdefault(proto.find("rollovertextid").text, {})[proto] = f"Description of {proto.attrib['name']}"
+    return stringIdsByOverwriters
+
+def setUp(monkeypatch, outputPath):
+    config = configparser.ConfigParser()
+    config["paths"] = {"outputPath":str(outputPath)}
+    os.makedirs(os.path.join(outputPath, "game/data/strings"), exist_ok=True)
+    monkeypatch.setattr(globals, "config", config)
+    monkeypatch.setattr(globals, "stringMap", {})
+    monkeypatch.setattr(globals, "historyTextStrings", [])
+    monkeypatch.setattr(globals, "dataCollection", {"proto.xml":ET.fromstring(PROTO_XML), "techtree.xml":ET.fromstring(TECHTREE_XML), "string_table.txt":{"STR_HISTORY_HISTORY":"History"}})
+    monkeypatch.setattr(unitdescription, "unitDescriptionOverrides", common.VersionedRegistry())
+
+def setUpOnly(monkeypatch):
+    monkeypatch.setattr(main, "prepareData", lambda: None)
+    monkeypatch.setattr(tech, "findRespawnTechs", lambda: None)
+    monkeypatch.setattr(tech, "setupTechOverrides", lambda: None)
+    monkeypatch.setattr(unitdescription, "setupUnitOverrides", fakeSetupUnitOverrides)
+    for kind, fake in (("unit", fakeUnitDescriptions), ("tech", fakeTechDescriptions)):
+        lookup, stridTag, collection, generator = main.ONLY_BUILD_KINDS[kind]
+        monkeypatch.setitem(main.ONLY_BUILD_KINDS, kind, (lookup, stridTag, collection, fake))
+
+def test_only_unit_output_matches_full_build(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(diagnostics, "finish", lambda: None)
+
+    setUp(monkeypatch, tmp_path / "full")
+    common.handleSharedStringIDConflicts(fakeUnitDescriptions(globals.dataCollection["proto.xml"]))
+    unitdescription.removeBannedStrings()
+    main.outputStrings()
+    full = main.readStringTable(main.stringModsPath())
+
+    setUp(monkeypatch, tmp_path / "only")
+    setUpOnly(monkeypatch)
+    main.buildOnly([("unit", "Hoplite"), ("unit", "AnimalOfSet")])
+    only = main.readStringTable(main.stringModsPath())
+
+    assert only == {"STR_UNIT_HOPLITE_LR":"Description of Hoplite"}
+    assert all(full[strid] == value for strid, value in only.items())
+
+def fakeGenerateTechDescriptions():
+    tech.findRespawnTechs()
+    tech.setupTechOverrides()
+    common.handleSharedStringIDConflicts(fakeTechDescriptions(globals.dataCollection["techtree.xml"]))
+
+def fakeGenerateUnitDescriptions():
+    unitdescription.setupUnitOverrides()
+    common.handleSharedStringIDConflicts(fakeUnitDescriptions(globals.dataCollection["proto.xml"]))
+    unitdescription.removeBannedStrings()
+
+def test_only_unit_and_tech_output_matches_full_build(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(diagnostics, "finish", lambda: None)
+
+    # The full build's generator order, with the real per kind pieces swapped for the fakes above
+    setUp(monkeypatch, tmp_path / "full")
+    setUpOnly(monkeypatch)
+    monkeypatch.setattr(main, "generateTechDescriptions", fakeGenerateTechDescriptions)
+    monkeypatch.setattr(main, "generateUnitDescriptions", fakeGenerateUnitDescriptions)
+    for generator in ("generateGodPowerDescriptions", "generateMajorGodDescriptions", "generateBlessingDescriptions", "generateLoadTips"):
+        monkeypatch.setattr(main, generator, lambda: None)
+    main.generateAll()
+    main.outputStrings()
+    full = main.readStringTable(main.stringModsPath())
+
+    setUp(monkeypatch, tmp_path / "only")
+    main.buildOnly([("unit", "Hoplite"), ("tech", "ArchaicAgeZeus")])
+    only = main.readStringTable(main.stringModsPath())
+
+    assert only == {"STR_UNIT_HOPLITE_LR":"Description of Hoplite", "STR_TECH_ZEUS_LR":"Description of ArchaicAgeZeus"}
+    assert all(full[strid] == value for strid, value in only.items())
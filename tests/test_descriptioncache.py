@@ -0,0 +1,56 @@
+import configparser
+import os
+import xml.etree.ElementTree as ET
+import globals
+import descriptioncache
+import unitdescription
+
+def makeOverride(text, captured):
+    return unitdescription.UnitDescription(additionalText=text, textPostprocessor=lambda lines: lines if captured else [])
+
+def test_fingerprint_keys_on_fields_and_function_identity():
+    assert descriptioncache.fingerprint(makeOverride("a", 1)) == descriptioncache.fingerprint(makeOverride("a", 2))
+    assert descriptioncache.fingerprint(makeOverride("a", 1)) != descriptioncache.fingerprint(makeOverride("b", 1))
+
+def test_fingerprint_does_not_walk_closures():
+    graph = []
+    for _ in range(100000):
+        graph = [graph, {"next":graph}]
+    fingerprint = descriptioncache.fingerprint(makeOverride("a", graph))
+    assert fingerprint == descriptioncache.fingerprint(makeOverride("a", None))
+
+def test_fingerprint_depth_is_bounded():
+    nested = []
+    for _ in range(100000):
+        nested = [nested]
+    assert " at 0x" in descriptioncache.fingerprint(nested)
+
+def writeInputs(root, stringTable):
+    gameplayDir = os.path.join(root, "data/game/data/gameplay")
+    stringsDir = os.path.join(root, "data/game/data/strings/English")
+    os.makedirs(gameplayDir, exist_ok=True)
+    os.makedirs(stringsDir, exist_ok=True)
+    with open(os.path.join(gameplayDir, "proto.xml"), "w") as f:
+        f.write("<protos/>")
+    with open(os.path.join(stringsDir, "string_table.txt"), "w") as f:
+        f.write(stringTable)
+    config = configparser.ConfigParser()
+    config.read_dict({"paths":{"dataPath":os.path.join(root, "data"), "configPath":root, "lang":"English"}})
+    return config
+
+def test_cache_key_covers_global_inputs_and_writes_per_process(tmp_path, monkeypatch):
+    element = ET.fromstring("<unit name='A'/>")
+    monkeypatch.setattr(globals, "config", writeInputs(str(tmp_path), "ID = \"STR_A\"   Str = \"A\""))
+    monkeypatch.setattr(descriptioncache, "_inputStamp", None)
+    before = descriptioncache.entryKey("tech", element, None)
+    monkeypatch.setattr(globals, "config", writeInputs(str(tmp_path), "ID = \"STR_A\"   Str = \"B\""))
+    monkeypatch.setattr(descriptioncache, "_inputStamp", None)
+    assert descriptioncache.entryKey("tech", element, None) != before
+
+    monkeypatch.setattr(descriptioncache, "cacheDir", str(tmp_path / "cache"))
+    replaced = []
+    realReplace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: (replaced.append(src), realReplace(src, dst)))
+    assert descriptioncache.cached("tech", element, None, lambda: "text") == "text"
+    assert replaced[0].endswith(f".{os.getpid()}.tmp")
+    assert descriptioncache.cached("tech", element, None, lambda: "other") == "text"
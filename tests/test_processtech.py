@@ -0,0 +1,50 @@
+import xml.etree.ElementTree as ET
+import common
+import godpower
+import tech
+import unitdescription
+
+TECHTREE_XML = """<techtree>
+<tech name="LightningWeapons"><rollovertextid>STR_TECH_LIGHTNING_WEAPONS_LR</rollovertextid></tech>
+<tech name="RelicTooth"><rollovertextid>STR_TECH_RELIC_TOOTH_LR</rollovertextid></tech>
+</techtree>"""
+
+def setUp(monkeypatch):
+    monkeypatch.setattr(tech, "techManualAdditions", common.VersionedRegistry())
+    monkeypatch.setattr(unitdescription, "unitDescriptionOverrides", common.VersionedRegistry())
+    monkeypatch.setattr(godpower, "godPowerProcessingParams", common.VersionedRegistry())
+    monkeypatch.setattr(tech, "_processTechCache", {})
+    generated = []
+    def fakeProcessTechText(techElem, skipAffectedObjects, lineJoin, bulletLateLines):
+        generated.append(techElem.attrib["name"])
+        # Like an ability tech naming the action it changes
+        override = unitdescription.unitDescriptionOverrides.get("Hoplite", None)
+        actionName = "Hand Attack" if override is None else override.actionNameOverrides.get("HandAttack", "Hand Attack")
+        if techElem.attrib["name"] == "RelicTooth":
+            # Relic text that includes another tech's
+            return f"Relic: {tech.processTech(common.techFromName('LightningWeapons'))}"
+        return f"{actionName}: +10% damage ({len(generated)})"
+    monkeypatch.setattr(tech, "_processTechText", fakeProcessTechText)
+    return ET.fromstring(TECHTREE_XML), generated
+
+def test_calls_after_setup_reuse_the_tech_generation_entry(monkeypatch):
+    techtree, generated = setUp(monkeypatch)
+    monkeypatch.setattr(common, "techFromName", lambda name: techtree.find(f"tech[@name='{name}']"))
+    lightningWeapons = techtree.find("tech[@name='LightningWeapons']")
+
+    # Tech generation
+    fromTechs = tech.processTech(lightningWeapons)
+    # Unit and god power setup register lots of overrides that this tech doesn't read
+    unitdescription.unitDescriptionOverrides["Toxotes"] = unitdescription.UnitDescription()
+    godpower.godPowerProcessingParams["Bolt"] = godpower.GodPowerParams("Bolt")
+    tech.techManualAdditions["RelicTooth"] = tech.TechAddition(endEntry="Tooth")
+    # Relic and AotG text afterwards
+    assert tech.processTech(lightningWeapons) == fromTechs
+    assert tech.processTech(techtree.find("tech[@name='RelicTooth']")) == f"Relic: {fromTechs}"
+    assert generated == ["LightningWeapons", "RelicTooth"]
+
+    # Replacing an entry it did read means it gets done again, and so does the relic that includes it
+    unitdescription.unitDescriptionOverrides["Hoplite"] = unitdescription.UnitDescription(actionNameOverrides={"HandAttack":"Spear Thrust"})
+    assert tech.processTech(techtree.find("tech[@name='RelicTooth']")).startswith("Relic: Spear Thrust:")
+    assert tech.processTech(lightningWeapons).startswith("Spear Thrust:")
+    assert generated == ["LightningWeapons", "RelicTooth", "RelicTooth", "LightningWeapons"]
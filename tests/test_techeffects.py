@@ -0,0 +1,50 @@
+import xml.etree.ElementTree as ET
+import globals
+import techapply
+import techeffects
+
+TECHTREE_XML = """<techtree>
+<tech name="Bronze"><effects>
+<effect type="Data" subtype="ArmorVulnerability" armortype="Hack" relativity="Absolute" amount="0.1"><target type="ProtoUnit">HumanSoldier</target></effect>
+</effects></tech>
+<tech name="Copper"><effects>
+<effect type="Data" subtype="Damage" action="HandAttack" relativity="BasePercent" amount="1.1"><target type="ProtoUnit">Hoplite</target></effect>
+</effects></tech>
+<tech name="Medicine"><effects>
+<effect type="Data" subtype="Hitpoints" relativity="BasePercent" amount="1.2"><target type="ProtoUnit">Hoplite</target><target type="ProtoUnit">Infantry</target></effect>
+<effect type="TextOutput" all="true"><target type="Player">STR_SOMETHING</target></effect>
+</effects></tech>
+<tech name="Pegasus"><effects>
+<effect type="Data" subtype="LOS" relativity="Absolute" amount="4"><target type="ProtoUnit">Toxotes</target></effect>
+<effect type="Data" subtype="LOS" relativity="Absolute" amount="4"><target type="ProtoUnit">Kataskopos</target></effect>
+</effects></tech>
+</techtree>"""
+
+PROTOS_BY_UNIT_TYPE = {"HumanSoldier":["Hoplite", "Toxotes"], "Infantry":["Hoplite"]}
+
+def setUp(monkeypatch):
+    table = techeffects.TechEffectTable(ET.fromstring(TECHTREE_XML))
+    monkeypatch.setattr(globals, "techEffectTable", table)
+    monkeypatch.setattr(globals, "protosByUnitType", PROTOS_BY_UNIT_TYPE)
+    # Kataskopos isn't a proto in this data
+    monkeypatch.setattr(globals, "protoRecords", {"Hoplite":None, "Toxotes":None})
+    return table
+
+def affectsByScan(row, protoName):
+    for target in row.effect.findall("target"):
+        if target.attrib.get("type", "").lower() == "protounit" and (target.text == protoName or protoName in PROTOS_BY_UNIT_TYPE.get(target.text, [])):
+            return True
+    return False
+
+def test_reverse_index_matches_a_scan_of_select(monkeypatch):
+    table = setUp(monkeypatch)
+    for protoName in ("Hoplite", "Toxotes", "Kataskopos"):
+        expected = [row for row in table.select() if protoName in globals.protoRecords and affectsByScan(row, protoName)]
+        assert table.effectsOnProto(protoName) == expected
+        assert table.techsAffectingProto(protoName) == list(dict.fromkeys(row.techName for row in expected))
+    assert table.techsAffectingProto("Hoplite") == ["Bronze", "Copper", "Medicine"]
+
+def test_stat_upgrades_leave_out_action_effects(monkeypatch):
+    setUp(monkeypatch)
+    assert techapply.statUpgradesForProto("Hoplite") == ["Bronze", "Medicine"]
+    assert techapply.statUpgradesForProto("Toxotes") == ["Bronze", "Pegasus"]
@@ -0,0 +1,33 @@
+import multiprocessing
+import xml.etree.ElementTree as ET
+import pytest
+import globals
+import common
+import diagnostics
+import tech
+
+TECHTREE_XML = """<techtree>
+<tech name="TechA"><rollovertextid>STR_TECH_A</rollovertextid></tech>
+<tech name="TechB"><rollovertextid>STR_TECH_B</rollovertextid></tech>
+<tech name="TechC"><rollovertextid>STR_TECH_C</rollovertextid></tech>
+<tech name="TechD"><rollovertextid>STR_TECH_D</rollovertextid></tech>
+</techtree>"""
+
+def fakeProcessTech(techElem):
+    common.warn("given by every tech")
+    return f"Description of {techElem.attrib['name']}"
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs forked workers to share the test's setup")
+def test_warnings_from_before_a_jobs_run_are_not_counted_again(monkeypatch):
+    techtree = ET.fromstring(TECHTREE_XML)
+    monkeypatch.setattr(globals, "dataCollection", {"techtree.xml":techtree})
+    monkeypatch.setattr(tech, "processTech", fakeProcessTech)
+    monkeypatch.setattr(tech, "parallelWorkers", 2)
+    monkeypatch.setattr(diagnostics, "collector", diagnostics.DiagnosticsCollector())
+
+    common.warn("given before the workers started")
+    values = tech._processTechsInParallel(list(techtree))
+
+    assert values == [f"Description of Tech{letter}" for letter in "ABCD"]
+    counts = {entry.message:entry.count for entry in diagnostics.collector.entries.values()}
+    assert counts == {"given before the workers started":1, "given by every tech":4}
@@ -0,0 +1,9 @@
+import icon
+import tooltipdoc
+
+def test_runs_are_escaped_inside_headers_colours_and_bullets():
+    document = tooltipdoc.TooltipDocument().header('The "King"  of the Hill :').line()
+    document.bullet(tooltipdoc.Markup('<icon="(16)(x)">'), " Two\nlines..", indent="  ")
+    document.line().colour("0.8,0.8,0.8", "[Infantry]")
+    expected = f'<tth>The \\"King\\" of the Hill:\\n  {icon.BULLET_POINT} <icon="(16)(x)"> Two\\nlines.\\n<color=0.8,0.8,0.8>[Infantry]</color>'
+    assert document.render() == expected
@@ -0,0 +1,30 @@
+import xml.etree.ElementTree as ET
+import globals
+import xmlprune
+
+PROTO_XML = """<protos>
+<unit name="Hoplite">
+<animfile>greek/units/infantry/hoplite/hoplite.xml</animfile>
+<soundsetfile>hoplite</soundsetfile>
+<minimapicon size="2">minimap_unit</minimapicon>
+<icon>units/greek/hoplite_icon</icon>
+<protoaction><name>HandAttack</name><impactsound><sound>hit</sound></impactsound><damage type="Hack">9</damage></protoaction>
+</unit>
+</protos>"""
+
+GODPOWER_XML = """<powers><power name="Thunderburst"><burstvfx>ThunderburstStrike</burstvfx><vfx>LightningFlash</vfx><camerashake>1</camerashake></power></powers>"""
+
+def test_prune_drops_unused_files_and_render_only_subtrees(monkeypatch):
+    monkeypatch.setattr(globals, "dataCollection", {
+        "proto.xml":ET.fromstring(PROTO_XML),
+        "god_powers":{"greek.godpowers":ET.fromstring(GODPOWER_XML)},
+        "attachments.xml":ET.fromstring("<attachments/>"),
+    })
+    xmlprune.pruneDataCollection()
+
+    assert set(globals.dataCollection.keys()) == {"proto.xml", "god_powers"}
+    hoplite = globals.dataCollection["proto.xml"].find("unit")
+    assert [child.tag for child in hoplite] == ["animfile", "icon", "protoaction"]
+    assert [child.tag for child in hoplite.find("protoaction")] == ["name", "damage"]
+    thunderburst = globals.dataCollection["god_powers"]["greek.godpowers"].find("power")
+    assert [child.tag for child in thunderburst] == ["burstvfx"]
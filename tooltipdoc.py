@@ -0,0 +1,131 @@
+import icon
+import re
+import dataclasses
+from typing import List, Union
+
+# A small document model for tooltip text. Generators add text, markup, <tth> headers, colour spans, bullets and line breaks to a TooltipDocument
+# instead of concatenating strings, and render() turns the whole thing into the final string in one go.
+# Documents can be nested inside each other (eg a cached fragment inside a bigger tooltip) without being rendered first.
+#
+# Rendered output is escaped the same way as everything else going to stringmods.txt: line breaks become a literal \n.
+# Plain text runs are escaped and normalised on the way out, markup (icons, or strings that were already built as tooltip text) goes in as it is.
+
+LINE_BREAK = "\\n"
+
+@dataclasses.dataclass
+class Run:
+    text: str
+
+@dataclasses.dataclass
+class Markup:
+    # Already in stringmods form, eg <icon=...> from the icon module
+    markup: str
+
+@dataclasses.dataclass
+class LineBreak:
+    pass
+
+@dataclasses.dataclass
+class Header:
+    # <tth> makes the rest of its line a header
+    content: "TooltipDocument"
+
+@dataclasses.dataclass
+class Colour:
+    # The arguments of the <color=...> tag, eg "0.65,0.65,0.65"
+    colour: str
+    content: "TooltipDocument"
+
+@dataclasses.dataclass
+class Bullet:
+    content: "TooltipDocument"
+    # 0 = top level bullet, 1+ = indented sub bullets
+    level: int = 0
+    # Between the bullet point and the content. A few older tooltips have none
+    gap: str = " "
+    # In place of the indent that comes from level, for the few older tooltips with their own
+    indent: Union[str, None] = None
+
+Node = Union[Run, Markup, LineBreak, Header, Colour, Bullet, "TooltipDocument"]
+
+class TooltipDocument:
+    def __init__(self, *nodes: Union[Node, str]):
+        self.nodes: List[Node] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: Union[Node, str]) -> "TooltipDocument":
+        if isinstance(node, str):
+            node = Run(node)
+        self.nodes.append(node)
+        return self
+
+    def text(self, text: str) -> "TooltipDocument":
+        return self.add(Run(text))
+
+    def markup(self, markup: str) -> "TooltipDocument":
+        return self.add(Markup(markup))
+
+    def line(self) -> "TooltipDocument":
+        return self.add(LineBreak())
+
+    def header(self, *content: Union[Node, str]) -> "TooltipDocument":
+        return self.add(Header(TooltipDocument(*content)))
+
+    def colour(self, colour: str, *content: Union[Node, str]) -> "TooltipDocument":
+        return self.add(Colour(colour, TooltipDocument(*content)))
+
+    def bullet(self, *content: Union[Node, str], level: int=0, gap: str=" ", indent: Union[str, None]=None) -> "TooltipDocument":
+        return self.add(Bullet(TooltipDocument(*content), level, gap, indent))
+
+    def render(self, lineBreak: str=LINE_BREAK) -> str:
+        parts = []
+        _renderInto(self, parts, lineBreak)
+        return "".join(parts)
+
+def _renderInto(document: TooltipDocument, parts: List[str], lineBreak: str):
+    for node in document.nodes:
+        if isinstance(node, Run):
+            parts.append(escapeText(node.text, lineBreak))
+        elif isinstance(node, Markup):
+            parts.append(node.markup)
+        elif isinstance(node, LineBreak):
+            parts.append(lineBreak)
+        elif isinstance(node, Header):
+            parts.append("<tth>")
+            _renderInto(node.content, parts, lineBreak)
+        elif isinstance(node, Colour):
+            parts.append(f"<color={node.colour}>")
+            _renderInto(node.content, parts, lineBreak)
+            parts.append("</color>")
+        elif isinstance(node, Bullet):
+            indent = '   ' * node.level if node.indent is None else node.indent
+            parts.append(f"{indent}{icon.BULLET_POINT if node.level == 0 else icon.BULLET_POINT_ALT}{node.gap}")
+            _renderInto(node.content, parts, lineBreak)
+        elif isinstance(node, TooltipDocument):
+            _renderInto(node, parts, lineBreak)
+        else:
+            raise TypeError(f"Unknown tooltip document node {node!r}")
+
+# A bare " would end the Str = "..." entry early, the icon markup writes them as \" too
+_UNESCAPED_QUOTE_PATTERN = re.compile(r'(?<!\\)"')
+
+def escapeText(text: str, lineBreak: str=LINE_BREAK) -> str:
+    text = text.replace("\r\n", "\n").replace("\n", lineBreak)
+    text = _UNESCAPED_QUOTE_PATTERN.sub('\\\\"', text)
+    return normaliseText(text)
+
+# Runs of spaces -> one space, ".." -> ".", " :" -> ":"
+# Same result as common.collapseSpaces followed by the two replaces, but as one scan
+_NORMALISE_PATTERN = re.compile(r" +:| +|\.\.")
+
+def _normaliseMatch(match: re.Match) -> str:
+    matched = match.group(0)
+    if matched == "..":
+        return "."
+    if matched.endswith(":"):
+        return ":"
+    return " "
+
+def normaliseText(text: str) -> str:
+    return _NORMALISE_PATTERN.sub(_normaliseMatch, text)
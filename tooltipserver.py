@@ -0,0 +1,105 @@
+import argparse
+import http.server
+import urllib.parse
+import time
+import globals
+import main
+import common
+import tech
+import godpower
+import unitdescription
+from typing import Callable, Dict, Union
+
+# Keeps a fully prepared build in memory and answers describe queries over localhost HTTP, for checking override changes without a full rebuild:
+#   GET /unit/Hoplite
+#   GET /tech/FreyrsGift
+#   GET /godpower/Bolt
+#   GET /string/STR_UNIT_HOPLITE_LR       (value from the build done at startup)
+# Add ?raw=1 to get text with literal \n escapes as they would be written to stringmods.txt.
+# Queries run the same code as the build, so some (eg techs with history text) may add to the in-memory history strings again. That doesn't matter here as nothing is written out.
+
+DEFAULT_PORT = 8765
+
+def queryUnit(name: str) -> Union[str, None]:
+    if common.protoFromName(name) is None:
+        return None
+    return unitdescription.describeUnit(name)
+
+def queryTech(name: str) -> Union[str, None]:
+    techElem = common.techFromName(name)
+    if techElem is None:
+        return None
+    return tech.processTech(techElem)
+
+def queryGodPower(name: str) -> Union[str, None]:
+    power = common.findGodPowerByName(name)
+    if power is None:
+        return None
+    return godpower.processGodPower(power)
+
+QUERY_HANDLERS: Dict[str, Callable[[str], Union[str, None]]] = {
+    "unit":queryUnit,
+    "tech":queryTech,
+    "godpower":queryGodPower,
+}
+
+class TooltipRequestHandler(http.server.BaseHTTPRequestHandler):
+    # String map as it was at the end of the startup build
+    builtStrings: Dict[str, str] = {}
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/") if part]
+        raw = urllib.parse.parse_qs(url.query).get("raw", ["0"])[0] == "1"
+        if len(parts) != 2:
+            self.respond(400, f"Expected /<{'|'.join(list(QUERY_HANDLERS.keys()) + ['string'])}>/<name>")
+            return
+        queryType, name = parts
+        start = time.perf_counter()
+        try:
+            if queryType == "string":
+                result = self.builtStrings.get(name, None)
+            elif queryType in QUERY_HANDLERS:
+                result = QUERY_HANDLERS[queryType](name)
+            else:
+                self.respond(400, f"Unknown query type {queryType}")
+                return
+        except Exception as e:
+            self.respond(500, f"{type(e).__name__}: {e}")
+            return
+        if result is None:
+            self.respond(404, f"Nothing found for {queryType} {name}")
+            return
+        if not raw:
+            result = result.replace("\\n", "\n")
+        self.respond(200, result)
+        print(f"{queryType} {name}: {1000*(time.perf_counter()-start):0.1f}ms")
+
+    def respond(self, code: int, text: str):
+        body = text.encode("utf8")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: int=DEFAULT_PORT):
+    print("Preparing data...")
+    main.prepareData()
+    main.generateAll()
+    TooltipRequestHandler.builtStrings = dict(globals.stringMap)
+    server = http.server.HTTPServer(("127.0.0.1", port), TooltipRequestHandler)
+    print(f"Serving tooltip queries on http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve tooltip describe queries from a prepared build")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve(parser.parse_args().port)
@@ -1,6 +1,6 @@
 import globals
 from xml.etree import ElementTree as ET
-from typing import Union, Dict, List, Callable, Any, Tuple
+from typing import Union, Dict, List, Callable, Any, Tuple, Iterable
 import dataclasses
 import common
 from common import protoFromName, findAndFetchText
@@ -10,6 +10,10 @@ import math
 import tech
 import copy
 import godpower
+import protorecord
+import descriptioncache
+import tooltipdoc
+import stattable
 
 # This also decides the order in which things appear in the list
 NOTABLE_UNIT_CLASSES = ("Hero", "AbstractInfantry", "AbstractArcher", "AbstractCavalry", "AbstractSiegeWeapon", "AbstractVillager", "AbstractArcherShip", "AbstractSiegeShip", 
@@ -102,8 +106,9 @@ IGNORE_UNITS = (
 )
 
 
-UNIT_CLASSES_COLOUR = lambda s: "<color=0.8,0.8,0.8>" + s + "</color>"
-UNIT_ABILITY_SOURCE_COLOUR = lambda s: "<color=0.8,0.8,0.8>" + s + "</color>"
+# tooltipdoc colour arguments
+UNIT_CLASSES_COLOUR = "0.8,0.8,0.8"
+UNIT_ABILITY_SOURCE_COLOUR = "0.8,0.8,0.8"
 
 
 
@@ -323,6 +328,12 @@ NON_ACTION_OBSERVATIONS = {
 }
 
 def checkProtoFlag(proto: ET.Element, name: str, flag: str):
+    record = protorecord.recordForProto(proto)
+    if record is not None:
+        if name == "unittype":
+            return flag in record.unittypes
+        if name == "flag":
+            return flag in record.flags
     return proto.find(f"{name}/[.='{flag}']") is not None
 
 GOD_POWER_FLAG_PREDICTIONS: Dict[str, Tuple[str, Callable[[ET.Element], bool]]] = {
@@ -561,34 +572,27 @@ class UnitDescription:
             orderedTypes += self.additionalClasses
         unitClassesString = ""
         if len(orderedTypes) > 0:
-            unitClassesString = UNIT_CLASSES_COLOUR("[" + (", ".join(orderedTypes)) + "] ")
+            unitClassesString = tooltipdoc.TooltipDocument().colour(UNIT_CLASSES_COLOUR, "[" + (", ".join(orderedTypes)) + "] ").render()
         return unitClassesString
     def unitStats(self, protoUnit: ET.Element):
         if self.hideStats:
             return ""
         unitStatsString = ""
-        velocity = findAndFetchText(protoUnit, "maxvelocity", 0.0, float)
+        record = protorecord.recordForProto(protoUnit)
+        if record is None:
+            record = protorecord.ProtoUnitRecord(protoUnit)
+        velocity = record.maxvelocity
         if velocity > 0.0:
             unitStatsString += f" {icon.iconSpeed()} {float(velocity):0.3g}"
 
-        losNode = protoUnit.find("los")
-        if losNode is not None:
-            unitStatsString += f" {icon.iconLos()} {float(losNode.text):0.3g}"
-
-        realHP = findAndFetchText(protoUnit, "maxhitpoints", 0.0, float)
-        isInvulnerable = protoUnit.find("flag/[.='Invulnerable']") is not None
-        if not isInvulnerable and realHP > 0.0:
-            ehpString = f" Effective HP:"
-            for dmgType in ("Hack", "Pierce", "Crush"):
-                armorNode = protoUnit.find(f"armor[@type='{dmgType}']")
-                if armorNode is not None:
-                    armor = float(armorNode.attrib['value'])
-                    if armor < 0.99:
-                        vuln = 1.0 - armor
-                        ehp = realHP/vuln
-                        ehpString += f" {icon.armorTypeIcon(dmgType)} {float(ehp):0.0f}" 
-            if len(ehpString) > 20:
-                unitStatsString += ehpString
+        if record.los is not None:
+            unitStatsString += f" {icon.iconLos()} {record.los:0.3g}"
+
+        ehpString = f" Effective HP:"
+        for dmgType, ehp in stattable.effectiveHitpoints(protoUnit).items():
+            ehpString += f" {icon.armorTypeIcon(dmgType)} {float(ehp):0.0f}" 
+        if len(ehpString) > 20:
+            unitStatsString += ehpString
         
         if unitStatsString.endswith(","):
             unitStatsString = unitStatsString[:-1]
@@ -620,7 +624,9 @@ class UnitDescription:
                 active = findAndFetchText(tactics, "active", 1, int)
             # This is run before the active state checking so that ability linking works correctly
             # Must check all actions and generate text for them even if they are not displayed by default
-            description = action.describeAction(protoUnit, actionNode, chargeType, self.actionNameOverrides.get(actionType, None), self.linkActionsToAbilities.get(actionType, None), overrideText=self.overrideActionInfoText.get(actionType, None))
+            described = action.describeActionResult(protoUnit, actionNode, chargeType, self.actionNameOverrides.get(actionType, None), self.linkActionsToAbilities.get(actionType, None), overrideText=self.overrideActionInfoText.get(actionType, None))
+            action.mergeContributions(described)
+            description = described.text
             if not active and actionType not in self.showActionsIfDisabled:
                 continue
             components = [self.preActionInfoText.get(actionType, ""), description, self.postActionInfoText.get(actionType, "")]
@@ -821,7 +827,7 @@ class UnitDescription:
                 abilityName = self.passiveAbilityLink[passiveAbilityKey]
                 if isinstance(returned, list):
                     returned = "\\n".join(returned)
-                abilityNode = globals.dataCollection["abilities_combined"].find(f"power[@name='{abilityName}']")
+                abilityNode = globals.abilityIndex.power(abilityName)
                 if abilityNode is None:
                     raise ValueError(f"{protoName} was passed {passiveAbilityKey} -> {abilityName} but no ability data named {abilityName} was found")
                 common.addToGlobalAbilityStrings(protoUnit, abilityNode, returned)
@@ -960,12 +966,23 @@ def oracleHistoryText(protoName):
         numberOfPlaces += 1
     return f"Favor income rate per second: {rate} + {quadraticTermString}x(current idle LOS bonus)²\\nFlat LOS boosts (eg Pelt of Argus) do NOT affect this: this is entirely dependent on the amount of idle bonus."
 
-unitDescriptionOverrides: Dict[str, UnitDescription] = {}
+unitDescriptionOverrides: Dict[str, UnitDescription] = common.VersionedRegistry()
+
+# [(header, tooltip text)] -> each header on its own line followed by its text, eg for per age stat progressions in unit history
+def headedSections(sections: List[Tuple[str, str]]) -> str:
+    document = tooltipdoc.TooltipDocument()
+    for index, (header, text) in enumerate(sections):
+        if index != 0:
+            document.line()
+        document.header(header).line().markup(text)
+    return document.render()
 
 def describeUnit(unit: Union[str, ET.Element]) -> Union[str, None]:
     unit = protoFromName(unit)
     #print(f"Processing protounit: {unit.attrib['name']}")
-    return unitDescriptionOverrides.get(unit.attrib["name"], UnitDescription()).generate(unit)
+    override = unitDescriptionOverrides.get(unit.attrib["name"], UnitDescription())
+    # Other protos' overrides change some of the text (eg action names), and are still being registered during generation
+    return descriptioncache.cached("unit", unit, (override, unitDescriptionOverrides.version), lambda: override.generate(unit))
 
 def compareGatherRates(protoOne: str, protoTwo: str, targetType: str, protoOneMult: float=1.0, protoTwoMult: float=1.0) -> str:
     protoOneRate = common.findAndFetchText(action.findActionByName(protoOne, "Gather"), f"rate[@type='{targetType}']", None, float) * protoOneMult
@@ -973,7 +990,7 @@ def compareGatherRates(protoOne: str, protoTwo: str, targetType: str, protoOneMu
     return f"{100*(protoOneRate/protoTwoRate):0.3g}%"
 
 
-def generateUnitDescriptions():
+def setupUnitOverrides():
     proto = globals.dataCollection["proto.xml"]
     techtree = globals.dataCollection["techtree.xml"]
 
@@ -990,12 +1007,12 @@ def generateUnitDescriptions():
     HideFlyingAttack = UnitDescription(ignoreActions=["RangedAttackFlying", "FlyingUnitAttack"])
 
     GullinburstiAges = ("Archaic", "Classical", "Heroic", "Mythic")
-    gullinburstiHistory = "\\n".join([f"<tth>{age}:\\n" + UnitDescription(preActionInfoText={"BirthAttack":"Shockwave when spawned:"}).generate(protoFromName(f"Gullinbursti{age}")) for age in GullinburstiAges])
+    gullinburstiHistory = headedSections([(f"{age}:", UnitDescription(preActionInfoText={"BirthAttack":"Shockwave when spawned:"}).generate(protoFromName(f"Gullinbursti{age}"))) for age in GullinburstiAges])
     GullinburstiHandler = UnitDescription(hideStats=True, ignoreActions=["HandAttack", "Gore", "DistanceLimiting", "BirthAttack"], historyText=gullinburstiHistory, hideNonActionObservations=True, additionalText="See in-game detail screen or Learn > Compendium > Units > Gullinbursti for detailed age stat progression.")
 
     NezhaAges = ("Classical", "Heroic", "Mythic")
     NezhaProtos = ("NezhaChild", "NezhaYouth", "Nezha")
-    nezhaHistory = "\\n".join([f"<tth>{NezhaAges[index]}:\\n" + UnitDescription().generate(protoFromName(proto)) for index, proto in enumerate(NezhaProtos)])
+    nezhaHistory = headedSections([(f"{NezhaAges[index]}:", UnitDescription().generate(protoFromName(proto))) for index, proto in enumerate(NezhaProtos)])
     NezhaHandler = UnitDescription(hideStats=True, overrideDescription="Hero with a melee attack that deals Divine damage over time. Gains additional power and abilities at age advancement.", ignoreActions=["HandAttack", "RangedAttack", "Trail"], historyText=nezhaHistory, hideNonActionObservations=False, additionalText=["Heroic Age: May switch to throwing Universe rings instead of attacking in melee.", "Mythic Age: May no longer switch attacks: instead passively throws Universe Rings automatically. Becomes amphibious, and leaves behind a trail of fire while moving.", "See in-game detail screen or Learn > Compendium > Units > Nezha for detailed age stat progression."])
 
 
@@ -1044,7 +1061,8 @@ def generateUnitDescriptions():
     unitDescriptionOverrides["Hydra"] = UnitDescription(passiveAbilityLink={"veterancy":"AbilityHydra"}, nonActionObservationArgs={"veterancy":["head"]})
     unitDescriptionOverrides["Scylla"] = UnitDescription(passiveAbilityLink={"veterancy":"AbilityScylla"}, nonActionObservationArgs={"veterancy":["head"]})
     unitDescriptionOverrides["HadesShade"] = UnitDescription(additionalText=f"Has a {float(globals.dataCollection['major_gods.xml'].find('./civ[name=' + stringLiteralHelper('Hades') + ']/shades/chance').text)*100.0:0.3g}% to appear at the Temple from the deaths of human soldiers.")
-    unitDescriptionOverrides["PlentyVault"] = UnitDescription(overrideDescription="<tth>Regular Plenty Vault:", additionalText="<tth>King of the Hill:\\n" + icon.BULLET_POINT + " " + UnitDescription(overrideClasses=True, additionalClasses=[], includeVanillaDescription=False, hideStats=True).generate(protoFromName("PlentyVaultKOTH")))
+    plentyVaultKOTH = UnitDescription(overrideClasses=True, additionalClasses=[], includeVanillaDescription=False, hideStats=True).generate(protoFromName("PlentyVaultKOTH"))
+    unitDescriptionOverrides["PlentyVault"] = UnitDescription(overrideDescription=tooltipdoc.TooltipDocument().header("Regular Plenty Vault:").render(), additionalText=tooltipdoc.TooltipDocument().header("King of the Hill:").line().bullet(tooltipdoc.Markup(plentyVaultKOTH)).render())
     unitDescriptionOverrides["Centaur"] = UnitDescription(postActionInfoText={"ChargedRangedAttack":action.actionDamageOverTimeArea('CentaurAreaDamage', 'ProgressiveDamageLight', altDamageText=f"{action.actionDamageOverTimeDamageFromAction(action.findActionByName('CentaurAreaDamage', 'ProgressiveDamageLight'), centaurSpecialDoTNeedsDamageBonuses)} for the first {float(action.actionTactics('CentaurAreaDamage', 'ProgressiveDamageLight').find('modifyduration').text)/1000:0.3g} seconds, followed by {action.actionDamageOverTimeDamageFromAction(action.findActionByName('CentaurAreaDamage', 'ProgressiveDamageHigh'), centaurSpecialDoTNeedsDamageBonuses)} for the next {float(action.actionTactics('CentaurAreaDamage', 'ProgressiveDamageHigh').find('modifyduration').text)/1000:0.3g} seconds")})
     unitDescriptionOverrides["Chimera"] = UnitDescription(postActionInfoText={"ChargedRangedAttack":action.actionDamageOverTimeArea('ChimeraFireArea', parentAction=action.findActionByName('Chimera', "ChargedRangedAttack"))})
     unitDescriptionOverrides["Carcinos"] = UnitDescription(linkActionsToAbilities={"SelfDestructAttack":"AbilityCarcinos"})
@@ -1136,7 +1154,7 @@ def generateUnitDescriptions():
     unitDescriptionOverrides["FireArcher"] = UnitDescription(preActionInfoText={"RangedAttack":"Specialist ranged soldier only good against infantry. Has a minor bonus against buildings."})
     unitDescriptionOverrides["ChuKoNu"] = UnitDescription(preActionInfoText={"RangedAttack":f"Generalist ranged soldier. High damage output, but long reload time ({action.actionRof(action.findActionByName('ChuKoNu', 'RangedAttack'))})."}, ignoreActions=["SelfDestructAttack"])
     unitDescriptionOverrides["WhiteHorseCavalry"] = UnitDescription(preActionInfoText={"HandAttack":f"Generalist cavalry, especially good against archers. Has a ranged attack which must recharge between uses."})
-    unitDescriptionOverrides["TigerCavalry"] = UnitDescription(preActionInfoText={"HandAttack":f"Generalist cavalry, especially good against archers and other cavalry. When killed, the rider continues fighting on foot."}, additionalText="<tth>Dismounted form:\\n  " + icon.BULLET_POINT + " " + describeUnit('TigerCavalryDismounted'))
+    unitDescriptionOverrides["TigerCavalry"] = UnitDescription(preActionInfoText={"HandAttack":f"Generalist cavalry, especially good against archers and other cavalry. When killed, the rider continues fighting on foot."}, additionalText=tooltipdoc.TooltipDocument().header("Dismounted form:").line().bullet(tooltipdoc.Markup(describeUnit('TigerCavalryDismounted')), indent="  ").render())
     pioneerClassicalRange = float(common.techFromName("ClassicalAgeChinese").find("effects/effect[@subtype='MaximumRange']/target[.='Pioneer']/..").attrib['amount'])
     pioneerClassicalLOS = float(common.techFromName("ClassicalAgeChinese").find("effects/effect[@subtype='LOS']/target[.='Pioneer']/..").attrib['amount'])
     unitDescriptionOverrides["Pioneer"] = UnitDescription(preActionInfoText={"RangedAttack":"Hero ranged soldier and scout. Primarily good against myth units, but reasonably effective against other targets."}, additionalText=[f"Gains +{pioneerClassicalRange:0.3g} Range and +{pioneerClassicalLOS:0.3g} LOS in the Classical Age.", 'Divine Light is required to pick up relics.'])
@@ -1554,7 +1572,7 @@ def generateUnitDescriptions():
         sourceObject = None
         if not isinstance(tooltip, str):
             sourceObject, tooltip = tooltip
-        abilityInfo = globals.dataCollection["abilities_combined"].find(f"power[@name='{abilityName}']")
+        abilityInfo = globals.abilityIndex.power(abilityName)
         if abilityInfo is None:
             raise ValueError(f"Couldn't find civ.abilities entry for {abilityName}")
         displayNameStrId = findAndFetchText(abilityInfo, "rolloverid", None)
@@ -1566,9 +1584,11 @@ def generateUnitDescriptions():
 
         #globals.stringMap[displayNameStrId] = tooltip
 
+# strid: {proto: description} for the given protos, ready for handleSharedStringIDConflicts
+def unitDescriptionsByStringId(protos: Iterable[ET.Element]) -> Dict[str, Dict[ET.Element, str]]:
     stringIdsByOverwriters: Dict[str, Dict[ET.Element, str]] = {}
     
-    for unit in proto:
+    for unit in protos:
         if unit.attrib["name"] in IGNORE_UNITS:
             continue
         strid = unit.find("rollovertextid")
@@ -1596,7 +1616,14 @@ def generateUnitDescriptions():
 
     # Keep the main playable form when variants share a rollover id but need different generated text.
     forceSharedStringOwner("Nezha", "NezhaChild")
+    return stringIdsByOverwriters
+
+def generateUnitDescriptions():
+    proto = globals.dataCollection["proto.xml"]
+    techtree = globals.dataCollection["techtree.xml"]
+    setupUnitOverrides()
 
+    stringIdsByOverwriters = unitDescriptionsByStringId(proto)
     common.handleSharedStringIDConflicts(stringIdsByOverwriters)
     common.handleSharedStringIDConflicts(globals.unitAbilityDescriptions)
 
@@ -1605,26 +1632,21 @@ def generateUnitDescriptions():
     techInternalToDisplayName = {}
     techsWithMultipleEnablers = set()
     for techElement in techtree:
-        effects = techElement.find("effects")
         displayName = common.getObjectDisplayName(techElement)
         if displayName.startswith("ArchaicAge"):
             displayName = displayName[10:]
         techInternalToDisplayName[techElement.attrib["name"]] = displayName
-        if effects is not None:
-            for effect in effects:
-                if effect.attrib.get("type", "") == "TechStatus" and effect.attrib.get("status", "") == "obtainable":
-                    enabledTech = effect.text
-                    if enabledTech in techsByEnabler:
-                        techsWithMultipleEnablers.add(enabledTech)
-                    else:
-                        techsByEnabler[enabledTech] = displayName
+    for enabledTech, enablers in globals.techGraph.enablers.items():
+        if globals.techGraph.multipleEnablers(enabledTech):
+            techsWithMultipleEnablers.add(enabledTech)
+        techsByEnabler[enabledTech] = techInternalToDisplayName[enablers[0]]
     # We do not want to pin a tech to an ability that something has without needing a tech
     abilitiesWithNoTechNode = set()
     for unitNode in globals.dataCollection["abilities"]["abilities.xml"]:
         for abilityNode in unitNode:
             techNode = abilityNode.find("tech")
             if techNode is None:
-                abilityInfo = globals.dataCollection["abilities_combined"].find(f"power[@name='{abilityNode.text}']")
+                abilityInfo = globals.abilityIndex.power(abilityNode.text)
                 if abilityInfo is not None and abilityInfo.attrib.get("type", "") == "GeneralEffect":
                     abilitiesWithNoTechNode.add(abilityNode.text)
 
@@ -1659,10 +1681,11 @@ def generateUnitDescriptions():
                                 bracketItems.append(techDisplayName)
                             if enablerName is not None:
                                 bracketItems.append(enablerName)
-                            brackets = ""
+                            # The name is already tooltip text, straight from the string table
+                            replacementDocument = tooltipdoc.TooltipDocument(tooltipdoc.Markup(baseAbilityName))
                             if len(bracketItems) > 0:
-                                brackets = UNIT_ABILITY_SOURCE_COLOUR(f"[{", ".join(bracketItems)}]")
-                            replacement = f"{baseAbilityName} {brackets}".strip()
+                                replacementDocument.text(" ").colour(UNIT_ABILITY_SOURCE_COLOUR, f"[{", ".join(bracketItems)}]")
+                            replacement = replacementDocument.render().strip()
 
                             if displayNameStrId in globals.stringMap and globals.stringMap[displayNameStrId] != replacement:
                                 abilityNameStringIdsWithMultipleReplacers.add(displayNameStrId)
@@ -1672,8 +1695,11 @@ def generateUnitDescriptions():
         del globals.stringMap[badStringId]
         print(f"Ability name {badStringId} had multiple different attempted replacements, removing")
 
+    removeBannedStrings()
 
+def removeBannedStrings(stringIds: Union[Iterable[str], None]=None):
+    # stringIds limits this to just those (for --only), otherwise everything generated so far is checked
     for badStringId in BANNED_STRINGS:
-        if badStringId in globals.stringMap:
+        if badStringId in globals.stringMap and (stringIds is None or badStringId in stringIds):
             print(f"Remove entry for blacklisted string {badStringId} ({len(globals.stringMap[badStringId])} chars)")
             del globals.stringMap[badStringId]
@@ -0,0 +1,64 @@
+import common
+import functools
+import xml.etree.ElementTree as ET
+from typing import Any, Union
+
+# Which library the data trees are parsed with. lxml is optional: with it, the case insensitive name lookups the game does
+# can be done as precompiled XPath instead of scanning every child in Python. Without it everything stays on ElementTree.
+# Set in config.ini as [xml] backend = elementtree/lxml/auto (auto = lxml if it's installed).
+# Anything making new nodes to put into the data trees needs to use makeElement, as lxml won't accept ElementTree nodes and vice versa.
+
+try:
+    import lxml.etree as lxmlEtree
+except ImportError:
+    lxmlEtree = None
+
+BACKENDS = ("elementtree", "lxml", "auto")
+
+usingLxml = False
+
+# For isinstance checks against data nodes, whichever backend they came from
+ELEMENT_TYPES = (ET.Element,) if lxmlEtree is None else (ET.Element, lxmlEtree._Element)
+
+# The game matches these names case insensitively. XPath 1.0 has no lower-case(), translate() is the usual way around that
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LOWER = "abcdefghijklmnopqrstuvwxyz"
+
+def useBackend(name: str):
+    global usingLxml
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown xml backend {name}, expected one of {', '.join(BACKENDS)}")
+    if name == "lxml" and lxmlEtree is None:
+        common.warn("xml backend is set to lxml, but lxml isn't installed: falling back to ElementTree")
+    usingLxml = name != "elementtree" and lxmlEtree is not None
+
+def parse(path: str) -> ET.Element:
+    if usingLxml:
+        # Comments and processing instructions would otherwise show up when iterating children
+        parser = lxmlEtree.XMLParser(remove_comments=True, remove_pis=True)
+        return lxmlEtree.parse(path, parser).getroot()
+    return ET.parse(path).getroot()
+
+def makeElement(tag: str, attrib: Union[dict, None]=None) -> ET.Element:
+    if usingLxml:
+        return lxmlEtree.Element(tag, attrib=attrib if attrib is not None else {})
+    return ET.Element(tag, attrib=attrib if attrib is not None else {})
+
+def isLxmlElement(elem: Any) -> bool:
+    return lxmlEtree is not None and isinstance(elem, lxmlEtree._Element)
+
+@functools.cache
+def _compiledChildByTextLookup(childTag: str, textTag: str):
+    return lxmlEtree.XPath(f"{childTag}[translate({textTag}, $upper, $lower) = $value][1]")
+
+def findChildByTextCaseInsensitive(parent: ET.Element, childTag: str, textTag: str, value: str) -> Union[ET.Element, None]:
+    "Return the first child of parent with the given tag, which has a textTag child whose text matches value case insensitively."
+    value = value.lower()
+    if isLxmlElement(parent):
+        result = _compiledChildByTextLookup(childTag, textTag)(parent, upper=_UPPER, lower=_LOWER, value=value)
+        return result[0] if result else None
+    for child in parent.iterfind(childTag):
+        if common.findAndFetchText(child, textTag, "").lower() == value:
+            return child
+    return None
@@ -0,0 +1,69 @@
+import globals
+import xmlbackend
+from typing import Dict
+
+# Drops the parts of the loaded data that no generator reads, so the build doesn't keep them resident for its whole run.
+# Runs after the aotg files have been merged into proto.xml/techtree.xml. simdata.xml never gets this far: loadXmls streams the attack timing out of it instead (see animtiming.py).
+# Two passes: whole files that nothing reads go, then render-only subtrees (sound, vfx, minimap and portrait art...) inside the files that are kept.
+# Attack timing is the only thing read from animation data, and that's already in globals.animAttackIndex, so anim file names are all that stays of that.
+
+# dataCollection keys that are read after load. Add to this when something starts reading a new file!
+USED_FILES = {
+    "abilities",
+    "god_powers",
+    "tactics",
+    "aotg_effects.xml",
+    "aotg_favorstash.xml",
+    "major_gods.xml",
+    "proto.xml",
+    "proto_unit_commands.xml",
+    "relics.xml",
+    "techtree.xml",
+    "terrain_unit_effects.xml",
+    "unit_type_data.xml",
+}
+
+# An element whose (lowercased) tag contains any of these is only there for rendering or audio, and goes along with everything under it
+RENDER_ONLY_TAG_FRAGMENTS = ("sound", "vfx", "particle", "decal", "minimap", "portrait", "banner", "camerashake")
+# ... except these, which a generator reads all the same. Add to this when something starts reading one!
+READ_RENDER_TAGS = {
+    # Thunderburst's strike proto (godpower.py)
+    "burstvfx",
+}
+
+# tag: whether it's render only
+_renderOnlyTags: Dict[str, bool] = {}
+
+def isRenderOnlyTag(tag: str) -> bool:
+    result = _renderOnlyTags.get(tag)
+    if result is None:
+        lowered = tag.lower()
+        result = lowered not in READ_RENDER_TAGS and any(fragment in lowered for fragment in RENDER_ONLY_TAG_FRAGMENTS)
+        _renderOnlyTags[tag] = result
+    return result
+
+def pruneRenderOnlySubtrees(root) -> int:
+    "Remove every render only element (and its subtree) under root. Returns how many were removed."
+    # Collected first, removing while iterating skips elements
+    removals = []
+    for parent in root.iter():
+        for child in parent:
+            # lxml comments and processing instructions have a function as their tag
+            if isinstance(child.tag, str) and isRenderOnlyTag(child.tag):
+                removals.append((parent, child))
+    for parent, child in removals:
+        parent.remove(child)
+    return len(removals)
+
+def pruneDataCollection():
+    for key in list(globals.dataCollection.keys()):
+        if key not in USED_FILES:
+            del globals.dataCollection[key]
+    removed = 0
+    for value in globals.dataCollection.values():
+        # Subdirectories (abilities, god_powers, tactics) are dicts of filename: tree
+        roots = value.values() if isinstance(value, dict) else (value,)
+        for root in roots:
+            if isinstance(root, xmlbackend.ELEMENT_TYPES):
+                removed += pruneRenderOnlySubtrees(root)
+    print(f"Pruned {removed} render only elements from the loaded data")